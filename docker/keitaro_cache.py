@@ -0,0 +1,101 @@
+"""
+Targeted cache invalidation for Keitaro datasets
+Celery task queued by keitaro-sync with the campaign days it changed
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from superset import db
+from superset.connectors.sqla.models import SqlaTable
+from superset.extensions import cache_manager, celery_app
+from superset.models.cache import CacheKey
+
+from keitaro_queries import get_query_filters, overlaps, uses_keitaro_table
+
+logger = logging.getLogger(__name__)
+
+# Parsed filters of a cached result are kept in the data cache under this prefix
+FILTERS_PREFIX = "keitaro_filters_"
+
+
+def get_keitaro_datasource_uids():
+    """Get uids of datasets built on tables written by keitaro-sync"""
+    uids = []
+    for dataset in db.session.query(SqlaTable).all():
+        if uses_keitaro_table(dataset.sql if dataset.sql else dataset.table_name):
+            uids.append(dataset.uid)
+    return uids
+
+
+def get_cached_filters(cache, cache_key, timeout):
+    """Get (found, filters) of a cached result, fetching the result only the first time
+
+    The result's SQL is parsed once and its filters stored next to it for
+    as long as the result lives, so later invalidations read a few bytes
+    instead of the whole payload. found is False if the result is gone.
+    """
+    entry = cache.get(FILTERS_PREFIX + cache_key)
+    if entry is not None:
+        return True, entry["filters"]
+
+    value = cache.get(cache_key)
+    if value is None:
+        return False, None
+    filters = get_query_filters(value.get("query") or "") if isinstance(value, dict) else None
+    cache.set(FILTERS_PREFIX + cache_key, {"filters": filters}, timeout=timeout)
+    return True, filters
+
+
+@celery_app.task(name="keitaro.invalidate_cache", soft_time_limit=300)
+def invalidate_cache(changes=None, campaign_id=None, ranges=None):
+    """Evict cached results of Keitaro datasets that cover changed days
+
+    changes maps campaign ids to their changed ["YYYY-MM-DD", "YYYY-MM-DD"]
+    ranges; campaign_id and ranges are still accepted from older senders.
+    Needs STORE_CACHE_KEYS_IN_METADATA_DB so cache keys can be found per
+    dataset. Superset adds a key row on every cache set, so duplicate
+    rows are dropped, as are rows of results that already expired.
+    """
+    if campaign_id is not None:
+        changes = {campaign_id: ranges}
+    changes = {int(c): r for c, r in (changes or {}).items()}
+
+    stats = {"evicted": 0, "kept": 0, "expired": 0, "duplicates": 0}
+    uids = get_keitaro_datasource_uids()
+    if not uids or not changes:
+        return stats
+
+    cache = cache_manager.data_cache
+    now = datetime.now()
+
+    newest = {}
+    rows = db.session.query(CacheKey).filter(CacheKey.datasource_uid.in_(uids)).order_by(CacheKey.created_on.desc())
+    for cache_key in rows:
+        if cache_key.cache_key in newest:
+            db.session.delete(cache_key)
+            stats["duplicates"] += 1
+        else:
+            newest[cache_key.cache_key] = cache_key
+
+    for key, cache_key in newest.items():
+        timeout = None
+        if cache_key.cache_timeout and cache_key.cache_timeout > 0:
+            timeout = (cache_key.created_on + timedelta(seconds=cache_key.cache_timeout) - now).total_seconds()
+            if timeout <= 0:
+                db.session.delete(cache_key)
+                stats["expired"] += 1
+                continue
+
+        found, filters = get_cached_filters(cache, key, int(timeout) + 1 if timeout else None)
+        if found and not any(overlaps(filters, c, r) for c, r in changes.items()):
+            stats["kept"] += 1
+            continue
+        if found:
+            cache.delete_many(key, FILTERS_PREFIX + key)
+            stats["evicted"] += 1
+        db.session.delete(cache_key)
+
+    db.session.commit()
+    logger.info(f"Keitaro campaigns changed {changes}: {stats}")
+    return stats
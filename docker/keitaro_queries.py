@@ -0,0 +1,93 @@
+"""
+Campaign and time filters of SQL that Superset ran on Keitaro tables
+Used by keitaro_cache to decide which cached results a sync made stale
+"""
+
+import re
+from datetime import datetime, timedelta
+
+# Tables written by keitaro-sync; datasets on them (or SQL using them) are affected
+KEITARO_TABLES = (
+    "keitaro_events",
+    "keitaro_events_named",
+    "keitaro_events_daily",
+    "keitaro_events_weekly",
+    "keitaro_events_monthly",
+    "keitaro_events_hourly",
+    "keitaro_conversions",
+)
+
+CAMPAIGN_FILTER = re.compile(r"campaign_id\s*(?:=\s*'?(\d+)'?|IN\s*\(([^)]*)\))", re.IGNORECASE)
+
+# Time filters Superset renders for Postgres, e.g. date >= TO_DATE('2026-01-01', ...)
+# or datetime < TO_TIMESTAMP('2026-01-05 12:00:00.000000', ...)
+TIME_FILTER = re.compile(
+    r"\b(date|datetime|bucket)\"?\s*(>=|>|<=|<)\s*(?:\w+\()?'(\d{4}-\d{2}-\d{2})(?:[ T]([\d:.]+))?",
+    re.IGNORECASE,
+)
+
+
+def uses_keitaro_table(source):
+    """Check whether a table name or SQL refers to a table written by keitaro-sync"""
+    return any(re.search(rf"\b{table}\b", source or "") for table in KEITARO_TABLES)
+
+
+def get_query_campaigns(query):
+    """Get campaign ids a cached query filters on, or None if it is not filtered"""
+    campaigns = set()
+    for single, listed in CAMPAIGN_FILTER.findall(query):
+        campaigns.update(int(c) for c in re.findall(r"\d+", single or listed))
+    return campaigns or None
+
+
+def get_query_window(query):
+    """Get the [start, end) days a cached query is limited to, None for open ends
+
+    An upper bound with a time of day includes that whole day. A rollup
+    bucket holds days up to a month after its own date, so the end of a
+    bucket filter is pushed out by 31 days.
+    """
+    start = end = None
+    for column, operator, value, time_of_day in TIME_FILTER.findall(query):
+        day = datetime.strptime(value, "%Y-%m-%d")
+        if operator.startswith(">"):
+            start = day if start is None else max(start, day)
+            continue
+        if operator == "<=" or time_of_day.strip("0:."):
+            day += timedelta(days=1)
+        if column.lower() == "bucket":
+            day += timedelta(days=31)
+        end = day if end is None else min(end, day)
+    return start, end
+
+
+def get_query_filters(query):
+    """Get (campaigns, start, end) a cached query is limited to
+
+    Returns None when the filters cannot be narrowed down, e.g. when the
+    query has an OR that could widen them.
+    """
+    if re.search(r"\bOR\b", query, re.IGNORECASE):
+        return None
+    return (get_query_campaigns(query), *get_query_window(query))
+
+
+def overlaps(filters, campaign_id, ranges):
+    """Check whether a result with these filters may include any changed day
+
+    ranges are inclusive ["YYYY-MM-DD", "YYYY-MM-DD"] pairs; filters of
+    None (not narrowed down) always overlap.
+    """
+    if filters is None:
+        return True
+
+    campaigns, start, end = filters
+    if campaigns is not None and campaign_id not in campaigns:
+        return False
+
+    for first, last in ranges:
+        changed_from = datetime.strptime(first, "%Y-%m-%d")
+        changed_to = datetime.strptime(last, "%Y-%m-%d") + timedelta(days=1)
+        if (start is None or start < changed_to) and (end is None or end > changed_from):
+            return True
+    return False
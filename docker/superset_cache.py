@@ -0,0 +1,351 @@
+"""
+Cache backends for Superset
+TieredRedisCache keeps hot, small entries in each worker process in front of Redis,
+compresses large values and counts hits, misses and bytes per key prefix
+"""
+
+import os
+import json
+import time
+import logging
+import zlib
+import threading
+from collections import OrderedDict, defaultdict
+
+from cachelib.serializers import RedisSerializer
+from flask_caching.backends.rediscache import RedisCache
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "superset_cache_invalidate"
+STATS_KEY = "superset_cache_stats:"
+
+# Codec name -> (marker byte, compress, decompress). Plain values start with
+# b"!" (pickle) or an ASCII integer, so the markers never clash with them.
+CODECS = {"zlib": (b"G", lambda data: zlib.compress(data, 6), zlib.decompress)}
+if zstandard is not None:
+    CODECS["zstd"] = (
+        b"Z",
+        lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    )
+if lz4 is not None:
+    CODECS["lz4"] = (b"L", lz4.frame.compress, lz4.frame.decompress)
+
+DECOMPRESSORS = {marker: decompress for marker, _, decompress in CODECS.values()}
+
+
+class CompressedRedisSerializer(RedisSerializer):
+    """cachelib's Redis serializer that also reads compressed values"""
+
+    def loads(self, value):
+        if value is not None and value[:1] in DECOMPRESSORS:
+            value = DECOMPRESSORS[value[:1]](value[1:])
+        return super().loads(value)
+
+
+class CacheStats:
+    """Hit/miss and byte counters of one key prefix
+
+    Each process adds to its own counters and flushes them with HINCRBY into
+    the Redis hash superset_cache_stats:<prefix> every few seconds, so the
+    totals over all workers are one HGETALL away.
+    """
+
+    def __init__(self, prefix, interval=10):
+        self.key = STATS_KEY + prefix
+        self.interval = interval
+        self.counts = defaultdict(int)
+        self.lock = threading.Lock()
+        self.next_flush = time.monotonic() + interval
+
+    def add(self, client, **counts):
+        """Add to counters, flushing them to Redis when the interval has passed"""
+        with self.lock:
+            for name, value in counts.items():
+                self.counts[name] += value
+            if time.monotonic() < self.next_flush:
+                return
+            pending, self.counts = self.counts, defaultdict(int)
+            self.next_flush = time.monotonic() + self.interval
+
+        try:
+            pipe = client.pipeline(transaction=False)
+            for name, value in pending.items():
+                pipe.hincrby(self.key, name, value)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Could not flush cache stats to {self.key}: {e}")
+
+
+class LocalCache:
+    """Bounded LRU of raw Redis values with a per-entry expiry"""
+
+    def __init__(self, size, timeout, max_item_bytes):
+        self.size = size
+        self.timeout = timeout
+        self.max_item_bytes = max_item_bytes
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Get (found, raw value) for a key"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False, None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return False, None
+            self.entries.move_to_end(key)
+            return True, entry[1]
+
+    def set(self, key, raw):
+        """Keep a raw value unless it is too large to be worth a local copy"""
+        if raw is not None and len(raw) > self.max_item_bytes:
+            return
+        expires = time.monotonic() + self.timeout
+        with self.lock:
+            self.entries[key] = (expires, raw)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def discard(self, keys):
+        """Drop keys from the local copy"""
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def discard_prefix(self, prefix):
+        """Drop every key starting with prefix"""
+        with self.lock:
+            for key in [k for k in self.entries if k.startswith(prefix)]:
+                del self.entries[key]
+
+
+class TieredRedisCache(RedisCache):
+    """Redis cache with a small in-process LRU (L1) in front of it
+
+    Reads of small values (CACHE_L1_MAX_ITEM_BYTES) are served from the
+    worker's own LRU for up to CACHE_L1_TIMEOUT seconds, misses included,
+    so hot keys skip the Redis round-trip. Every write publishes the keys
+    it touched on a Redis channel, and a listener in each process evicts
+    them from its LRU; the short TTL bounds staleness if a message is lost.
+    Values are kept serialized, so every hit gets its own copy.
+
+    Serialized values of at least CACHE_COMPRESS_THRESHOLD bytes are
+    compressed with CACHE_COMPRESSION (zstd, lz4 or zlib; None turns it off),
+    and values still over CACHE_MAX_ITEM_BYTES after that are not cached at
+    all. Entries written uncompressed keep loading after either is changed.
+    """
+
+    def __init__(
+        self,
+        *args,
+        l1_size=1024,
+        l1_timeout=5,
+        l1_max_item_bytes=64 * 1024,
+        compression=None,
+        compress_threshold=16 * 1024,
+        max_item_bytes=0,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.l1_size = l1_size
+        self.l1_timeout = l1_timeout
+        self.l1_max_item_bytes = l1_max_item_bytes
+        self.serializer = CompressedRedisSerializer()
+        if compression and compression not in CODECS:
+            logger.warning(f"Cache compression {compression} is not available, using zlib")
+            compression = "zlib"
+        self.codec = CODECS[compression] if compression else None
+        self.compress_threshold = compress_threshold
+        self.max_item_bytes = max_item_bytes
+        self.stats = CacheStats(self._get_prefix())
+        self._pid = None
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(
+            l1_size=config.get("CACHE_L1_SIZE", 1024),
+            l1_timeout=config.get("CACHE_L1_TIMEOUT", 5),
+            l1_max_item_bytes=config.get("CACHE_L1_MAX_ITEM_BYTES", 64 * 1024),
+            compression=config.get("CACHE_COMPRESSION"),
+            compress_threshold=config.get("CACHE_COMPRESS_THRESHOLD", 16 * 1024),
+            max_item_bytes=config.get("CACHE_MAX_ITEM_BYTES", 0),
+        )
+        return super().factory(app, config, args, kwargs)
+
+    @property
+    def local(self):
+        """Get this process's LRU, starting its invalidation listener after a fork"""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._local = LocalCache(self.l1_size, self.l1_timeout, self.l1_max_item_bytes)
+            threading.Thread(target=self._listen, name="superset-cache-invalidation", daemon=True).start()
+        return self._local
+
+    def _listen(self):
+        """Evict keys other processes wrote, reconnecting until the process exits"""
+        local = self._local
+        while True:
+            try:
+                pubsub = self._write_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                for message in pubsub.listen():
+                    keys = json.loads(message["data"])
+                    if keys and keys[0] == "*":
+                        local.discard_prefix(keys[1])
+                    else:
+                        local.discard(keys)
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener failed, reconnecting: {e}")
+                local.discard_prefix("")
+                time.sleep(5)
+
+    def _publish(self, keys):
+        """Evict keys locally and in every other process"""
+        self.local.discard(keys)
+        try:
+            self._write_client.publish(INVALIDATION_CHANNEL, json.dumps(keys))
+        except Exception as e:
+            logger.warning(f"Could not publish cache invalidation: {e}")
+
+    def _dump(self, value):
+        """Serialize and maybe compress a value; None if it is too large to cache"""
+        raw = self.serializer.dumps(value)
+        dump = raw
+        if self.codec is not None and len(raw) >= self.compress_threshold:
+            dump = self.codec[0] + self.codec[1](raw)
+        if self.max_item_bytes and len(dump) > self.max_item_bytes:
+            self.stats.add(self._write_client, skipped=1, bytes_skipped=len(dump))
+            logger.info(f"Not caching {len(dump)} byte value under {self._get_prefix()}, over {self.max_item_bytes}")
+            return None
+        self.stats.add(self._write_client, sets=1, bytes_written=len(dump), bytes_uncompressed=len(raw))
+        return dump
+
+    def _count_reads(self, raws, local_hits=0):
+        """Count hits, misses and bytes of raw values read"""
+        hits = sum(1 for raw in raws if raw is not None)
+        self.stats.add(
+            self._write_client,
+            hits=hits,
+            misses=len(raws) - hits,
+            local_hits=local_hits,
+            bytes_read=sum(len(raw) for raw in raws if raw is not None),
+        )
+
+    def get(self, key):
+        full_key = self._get_prefix() + key
+        found, raw = self.local.get(full_key)
+        if not found:
+            raw = self._read_client.get(full_key)
+            self.local.set(full_key, raw)
+        self._count_reads([raw], local_hits=int(found and raw is not None))
+        return self.serializer.loads(raw)
+
+    def get_many(self, *keys):
+        full_keys = [self._get_prefix() + key for key in keys]
+        values = {}
+        missing = []
+        for full_key in full_keys:
+            found, raw = self.local.get(full_key)
+            if found:
+                values[full_key] = raw
+            else:
+                missing.append(full_key)
+
+        if missing:
+            for full_key, raw in zip(missing, self._read_client.mget(missing)):
+                self.local.set(full_key, raw)
+                values[full_key] = raw
+        local_hits = sum(1 for full_key in full_keys if full_key not in missing and values[full_key] is not None)
+        self._count_reads([values[full_key] for full_key in full_keys], local_hits)
+        return [self.serializer.loads(values[full_key]) for full_key in full_keys]
+
+    def has(self, key):
+        found, raw = self.local.get(self._get_prefix() + key)
+        if found:
+            return raw is not None
+        return super().has(key)
+
+    def set(self, key, value, timeout=None):
+        full_key = self._get_prefix() + key
+        dump = self._dump(value)
+        if dump is None:
+            # Don't leave an older value behind the one that was refused
+            self._write_client.delete(full_key)
+            self._publish([full_key])
+            return False
+        timeout = self._normalize_timeout(timeout)
+        result = self._write_client.set(name=full_key, value=dump, ex=timeout if timeout != -1 else None)
+        self._publish([full_key])
+        return result
+
+    def add(self, key, value, timeout=None):
+        dump = self._dump(value)
+        if dump is None:
+            return False
+        timeout = self._normalize_timeout(timeout)
+        full_key = self._get_prefix() + key
+        result = self._write_client.set(name=full_key, value=dump, ex=timeout if timeout != -1 else None, nx=True)
+        if result:
+            self._publish([full_key])
+        return bool(result)
+
+    def set_many(self, mapping, timeout=None):
+        timeout = self._normalize_timeout(timeout)
+        pipe = self._write_client.pipeline(transaction=False)
+        stored = []
+        for key, value in mapping.items():
+            dump = self._dump(value)
+            if dump is None:
+                pipe.delete(self._get_prefix() + key)
+            else:
+                pipe.set(name=self._get_prefix() + key, value=dump, ex=timeout if timeout != -1 else None)
+            stored.append(dump is not None)
+        results = pipe.execute()
+        self._publish([self._get_prefix() + key for key in mapping])
+        return [key for key, was_stored, result in zip(mapping, stored, results) if was_stored and result]
+
+    def delete(self, key):
+        result = super().delete(key)
+        self._publish([self._get_prefix() + key])
+        return result
+
+    def delete_many(self, *keys):
+        # cachelib checks has() after deleting, which must not see the local copies
+        self.local.discard([self._get_prefix() + key for key in keys])
+        result = super().delete_many(*keys)
+        self._publish([self._get_prefix() + key for key in keys])
+        return result
+
+    def inc(self, key, delta=1):
+        result = super().inc(key, delta)
+        self._publish([self._get_prefix() + key])
+        return result
+
+    def dec(self, key, delta=1):
+        result = super().dec(key, delta)
+        self._publish([self._get_prefix() + key])
+        return result
+
+    def clear(self):
+        result = super().clear()
+        self.local.discard_prefix(self._get_prefix())
+        try:
+            self._write_client.publish(INVALIDATION_CHANNEL, json.dumps(["*", self._get_prefix()]))
+        except Exception as e:
+            logger.warning(f"Could not publish cache invalidation: {e}")
+        return result
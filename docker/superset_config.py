@@ -5,6 +5,7 @@ Optimized for Railway deployment with PostgreSQL and Redis
 
 import os
 from datetime import timedelta
+from urllib.parse import urlparse
 from celery.schedules import crontab
 
 # =============================================================================
@@ -61,29 +62,40 @@ else:
 
 # Cache configuration - use simple cache if Redis not available
 if REDIS_URL and REDIS_URL not in ("redis://", "none", ""):
+    # Redis behind a small per-worker LRU, invalidated across workers via pub/sub
+    # (docker/superset_cache.py); values over CACHE_L1_MAX_ITEM_BYTES skip the LRU.
+    # Hits, misses and bytes per prefix: HGETALL superset_cache_stats:<prefix>
+    _TIERED_CACHE = {
+        "CACHE_TYPE": "superset_cache.TieredRedisCache",
+        "CACHE_REDIS_URL": REDIS_URL,
+        "CACHE_L1_SIZE": int(os.environ.get("CACHE_L1_SIZE", 1024)),
+        "CACHE_L1_TIMEOUT": int(os.environ.get("CACHE_L1_TIMEOUT", 5)),
+        "CACHE_L1_MAX_ITEM_BYTES": int(os.environ.get("CACHE_L1_MAX_ITEM_BYTES", 64 * 1024)),
+    }
     CACHE_CONFIG = {
-        "CACHE_TYPE": "RedisCache",
+        **_TIERED_CACHE,
         "CACHE_DEFAULT_TIMEOUT": 300,
         "CACHE_KEY_PREFIX": "superset_",
-        "CACHE_REDIS_URL": REDIS_URL,
     }
     DATA_CACHE_CONFIG = {
-        "CACHE_TYPE": "RedisCache",
+        **_TIERED_CACHE,
         "CACHE_DEFAULT_TIMEOUT": 86400,
         "CACHE_KEY_PREFIX": "superset_data_",
-        "CACHE_REDIS_URL": REDIS_URL,
+        # Chart results: zstd above the threshold, results larger than the
+        # maximum after compression are recomputed instead of cached (0 = no limit)
+        "CACHE_COMPRESSION": os.environ.get("DATA_CACHE_COMPRESSION", "zstd") or None,
+        "CACHE_COMPRESS_THRESHOLD": int(os.environ.get("DATA_CACHE_COMPRESS_THRESHOLD", 16 * 1024)),
+        "CACHE_MAX_ITEM_BYTES": int(os.environ.get("DATA_CACHE_MAX_ITEM_BYTES", 32 * 1024 * 1024)),
     }
     FILTER_STATE_CACHE_CONFIG = {
-        "CACHE_TYPE": "RedisCache",
+        **_TIERED_CACHE,
         "CACHE_DEFAULT_TIMEOUT": 86400,
         "CACHE_KEY_PREFIX": "superset_filter_",
-        "CACHE_REDIS_URL": REDIS_URL,
     }
     EXPLORE_FORM_DATA_CACHE_CONFIG = {
-        "CACHE_TYPE": "RedisCache",
+        **_TIERED_CACHE,
         "CACHE_DEFAULT_TIMEOUT": 86400,
         "CACHE_KEY_PREFIX": "superset_explore_",
-        "CACHE_REDIS_URL": REDIS_URL,
     }
 else:
     # Fallback to simple in-memory cache
@@ -108,10 +120,24 @@ else:
 # CELERY CONFIGURATION
 # =============================================================================
 
+# Lets keitaro_cache find the cached results of each dataset when
+# keitaro-sync reports changed days (task keitaro.invalidate_cache)
+STORE_CACHE_KEYS_IN_METADATA_DB = True
+
+# Most viewed dashboards whose charts are pre-run into DATA_CACHE_CONFIG
+CACHE_WARMUP_TOP_N = int(os.environ.get("CACHE_WARMUP_TOP_N", 10))
+
 if REDIS_URL and REDIS_URL not in ("redis://", "none", ""):
     class CeleryConfig:
         broker_url = REDIS_URL
         result_backend = REDIS_URL
+        imports = (
+            "superset.sql_lab",
+            "superset.tasks.scheduler",
+            "superset.tasks.cache",
+            "superset.tasks.async_queries",
+            "keitaro_cache",
+        )
         worker_prefetch_multiplier = 1
         task_acks_late = True
         task_annotations = {
@@ -128,12 +154,65 @@ if REDIS_URL and REDIS_URL not in ("redis://", "none", ""):
                 "task": "reports.prune_log",
                 "schedule": crontab(minute=0, hour=0),
             },
+            # Before the working day (06:00 Moscow); keitaro-sync also
+            # queues cache-warmup after every sync round that wrote data
+            "cache-warmup-morning": {
+                "task": "cache-warmup",
+                "schedule": crontab(minute=0, hour=3),
+                "kwargs": {
+                    "strategy_name": "top_n_dashboards",
+                    "top_n": CACHE_WARMUP_TOP_N,
+                    "since": "7 days ago",
+                },
+            },
         }
 
     CELERY_CONFIG = CeleryConfig
 else:
     CELERY_CONFIG = None
 
+# =============================================================================
+# ASYNC QUERIES / RESULTS BACKEND
+# =============================================================================
+
+if REDIS_URL and REDIS_URL not in ("redis://", "none", ""):
+    from cachelib.redis import RedisCache
+    from redis import Redis
+
+    # SQL Lab results; Superset msgpack-serializes and zlib-compresses them
+    RESULTS_BACKEND = RedisCache(
+        host=Redis.from_url(REDIS_URL),
+        key_prefix="superset_results_",
+        default_timeout=int(os.environ.get("RESULTS_BACKEND_TIMEOUT", 60 * 60 * 24)),
+    )
+    RESULTS_BACKEND_USE_MSGPACK = True
+    # Larger result sets fail fast instead of filling Redis
+    SQLLAB_PAYLOAD_MAX_MB = int(os.environ.get("SQLLAB_PAYLOAD_MAX_MB", 50))
+
+    # Chart queries run on superset-worker; browsers poll for the results.
+    # Opt-in: without a running worker every chart would wait forever.
+    GLOBAL_ASYNC_QUERIES = os.environ.get("GLOBAL_ASYNC_QUERIES", "false").lower() == "true"
+    _redis = urlparse(REDIS_URL)
+    GLOBAL_ASYNC_QUERIES_CACHE_BACKEND = {
+        "CACHE_TYPE": "RedisCache",
+        "CACHE_REDIS_HOST": _redis.hostname or "localhost",
+        "CACHE_REDIS_PORT": _redis.port or 6379,
+        "CACHE_REDIS_USER": _redis.username or "",
+        "CACHE_REDIS_PASSWORD": _redis.password or "",
+        "CACHE_REDIS_DB": int(_redis.path.lstrip("/") or 0),
+        "CACHE_REDIS_SSL": _redis.scheme == "rediss",
+        "CACHE_DEFAULT_TIMEOUT": 300,
+    }
+    GLOBAL_ASYNC_QUERIES_TRANSPORT = "polling"
+    GLOBAL_ASYNC_QUERIES_POLLING_DELAY = 500  # ms
+    GLOBAL_ASYNC_QUERIES_REDIS_STREAM_PREFIX = "async-events-"
+    GLOBAL_ASYNC_QUERIES_JWT_COOKIE_SECURE = os.environ.get("SESSION_COOKIE_SECURE", "true").lower() == "true"
+    GLOBAL_ASYNC_QUERIES_JWT_COOKIE_SAMESITE = "Lax"
+else:
+    # No Redis: queries run synchronously in the web workers
+    RESULTS_BACKEND = None
+    GLOBAL_ASYNC_QUERIES = False
+
 # =============================================================================
 # FEATURE FLAGS
 # =============================================================================
@@ -148,12 +227,9 @@ FEATURE_FLAGS = {
     "SCHEDULED_QUERIES": True,
     "SQL_VALIDATORS_BY_ENGINE": True,
     "THUMBNAILS": False,
-    "GLOBAL_ASYNC_QUERIES": False,  # Disabled - requires results backend
+    "GLOBAL_ASYNC_QUERIES": GLOBAL_ASYNC_QUERIES,  # Requires Redis and superset-worker
 }
 
-# Results backend for async queries (using Redis)
-RESULTS_BACKEND = None  # Disable async results
-
 # =============================================================================
 # SECURITY SETTINGS
 # =============================================================================
@@ -241,4 +317,6 @@ else:
 
 # Alerts & Reports
 ALERT_REPORTS_NOTIFICATION_DRY_RUN = False
+# Where workers reach the web app: reports and the cache-warmup task request it from
+# superset-worker, so in docker-compose or on Railway it must be the web service
 WEBDRIVER_BASEURL = os.environ.get("WEBDRIVER_BASEURL", "http://localhost:8088/")
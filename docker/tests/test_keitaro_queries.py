@@ -0,0 +1,97 @@
+"""
+Tests for the SQL filter parsing that decides which Keitaro chart caches are stale
+Run with: python -m pytest docker/tests
+"""
+
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keitaro_queries import (  # noqa: E402
+    get_query_campaigns,
+    get_query_filters,
+    get_query_window,
+    overlaps,
+    uses_keitaro_table,
+)
+
+DAILY_CHART = """
+SELECT date AS date, event_type AS event_type, sum(event_count) AS "SUM(event_count)"
+FROM public.keitaro_events
+WHERE date >= TO_DATE('2026-01-01', 'YYYY-MM-DD') AND date < TO_DATE('2026-01-08', 'YYYY-MM-DD')
+  AND campaign_id IN (12, 15)
+GROUP BY date, event_type
+LIMIT 10000
+"""
+
+RAW_CHART = """
+SELECT sub_id_2, count(*) AS count
+FROM public.keitaro_conversions
+WHERE datetime >= TO_TIMESTAMP('2026-01-01 00:00:00.000000', 'YYYY-MM-DD HH24:MI:SS.US')
+  AND datetime < TO_TIMESTAMP('2026-01-05 12:00:00.000000', 'YYYY-MM-DD HH24:MI:SS.US')
+  AND campaign_id = 12
+GROUP BY sub_id_2
+"""
+
+
+def day(value):
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def test_keitaro_tables():
+    assert uses_keitaro_table("keitaro_events")
+    assert uses_keitaro_table("keitaro_conversions")
+    assert uses_keitaro_table("SELECT * FROM public.keitaro_events_named")
+    assert not uses_keitaro_table("keitaro_events_archive")
+    assert not uses_keitaro_table(None)
+
+
+def test_campaigns():
+    assert get_query_campaigns(DAILY_CHART) == {12, 15}
+    assert get_query_campaigns(RAW_CHART) == {12}
+    assert get_query_campaigns("WHERE campaign_id = '7'") == {7}
+    assert get_query_campaigns("SELECT * FROM keitaro_events") is None
+
+
+def test_window_dates():
+    assert get_query_window(DAILY_CHART) == (day("2026-01-01"), day("2026-01-08"))
+    assert get_query_window("WHERE date <= '2026-01-07'") == (None, day("2026-01-08"))
+    assert get_query_window("SELECT 1") == (None, None)
+
+
+def test_window_upper_bound_with_time_includes_its_day():
+    assert get_query_window(RAW_CHART) == (day("2026-01-01"), day("2026-01-06"))
+    assert get_query_window("WHERE datetime < '2026-01-05 00:00:00'") == (None, day("2026-01-05"))
+    assert get_query_window("WHERE datetime < '2026-01-05T00:00:01'") == (None, day("2026-01-06"))
+
+
+def test_window_bucket_end_covers_the_bucket():
+    start, end = get_query_window("WHERE bucket >= '2026-01-01' AND bucket < '2026-02-01'")
+    assert (start, end) == (day("2026-01-01"), day("2026-03-04"))
+
+
+def test_filters_with_or_are_not_narrowed():
+    assert get_query_filters("WHERE campaign_id = 12 OR campaign_id = 13") is None
+    assert get_query_filters(DAILY_CHART) == ({12, 15}, day("2026-01-01"), day("2026-01-08"))
+
+
+def test_overlaps():
+    filters = get_query_filters(DAILY_CHART)
+    assert overlaps(filters, 12, [["2026-01-07", "2026-01-07"]])
+    assert overlaps(filters, 15, [["2025-12-20", "2026-01-01"]])
+    assert not overlaps(filters, 12, [["2026-01-08", "2026-01-09"]])
+    assert not overlaps(filters, 13, [["2026-01-03", "2026-01-03"]])
+    assert overlaps(None, 13, [["2026-01-03", "2026-01-03"]])
+
+
+def test_overlaps_timestamp_bound_day():
+    filters = get_query_filters(RAW_CHART)
+    assert overlaps(filters, 12, [["2026-01-05", "2026-01-05"]])
+    assert not overlaps(filters, 12, [["2026-01-06", "2026-01-06"]])
+
+
+def test_overlaps_unfiltered_query():
+    filters = get_query_filters("SELECT date, sum(event_count) FROM keitaro_events GROUP BY date")
+    assert overlaps(filters, 99, [["2020-01-01", "2020-01-01"]])
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the Keitaro sync pipeline
+Runs fetch_keitaro_data and sync_campaign against the mock Keitaro server
+and reports rows/sec, peak RSS and DB write time
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import resource
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port():
+    """Get a free local TCP port"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_mock(args, port):
+    """Start the mock server in its own process so its memory is not measured"""
+    process = subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, "mock_keitaro.py"),
+        "--port", str(port),
+        "--rows", str(args.rows),
+        "--from", args.date_from,
+        "--to", args.date_to,
+        "--latency-ms", str(args.latency_ms),
+        "--error-rate", str(args.error_rate),
+        "--campaigns", str(args.campaign),
+    ], stdout=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("Mock Keitaro server did not start")
+
+
+def peak_rss_mb():
+    """Get peak resident set size of this process in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Benchmark the Keitaro sync pipeline offline")
+    parser.add_argument("--rows", type=int, default=100000, help="conversions served by the mock")
+    parser.add_argument("--from", dest="date_from", default="2026-01-01")
+    parser.add_argument("--to", dest="date_to", default="2026-01-30")
+    parser.add_argument("--latency-ms", type=float, default=20, help="mock latency per request")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of mock requests failing")
+    parser.add_argument("--campaign", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--page-size", type=int, default=500, help="conversions/log page size, pinned (not tuned)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    port = free_port()
+    mock = start_mock(args, port)
+
+    # keitaro_sync reads its configuration at import time
+    os.environ["KEITARO_URL"] = f"http://127.0.0.1:{port}"
+    os.environ.setdefault("KEITARO_API_KEY", "bench")
+    os.environ.setdefault("KEITARO_RPS", "0")
+    os.environ.setdefault("KEITARO_BACKOFF", "0.05")
+    # Equal bounds disable page size tuning, so runs do not depend on earlier ones
+    for name in ("PAGE_SIZE", "PAGE_SIZE_MIN", "PAGE_SIZE_MAX"):
+        os.environ[name] = str(args.page_size)
+    sys.path.insert(0, os.path.dirname(BENCH_DIR))
+    import keitaro_sync
+
+    results = {
+        "rows": args.rows,
+        "latency_ms": args.latency_ms,
+        "error_rate": args.error_rate,
+        "page_size": args.page_size,
+    }
+    try:
+        # Fetch only: API throughput, decoding and aggregation
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            rows, _ = keitaro_sync.fetch_keitaro_data(args.campaign, args.date_from, args.date_to)
+            timings.append(time.perf_counter() - started)
+        fetch_time = min(timings)
+        results["fetch_seconds"] = round(fetch_time, 3)
+        results["fetch_rows_per_sec"] = round(sum(r["conversions"] for r in rows) / fetch_time)
+        results["fetch_peak_rss_mb"] = round(peak_rss_mb(), 1)
+
+        # Full sync against Postgres, timing the DB writes separately
+        if keitaro_sync.DATABASE_URL:
+            keitaro_sync.init_database()
+            upsert_events = keitaro_sync.upsert_events
+            write_times = []
+
+            def timed_upsert(cur, values):
+                started = time.perf_counter()
+                result = upsert_events(cur, values)
+                write_times.append(time.perf_counter() - started)
+                return result
+
+            keitaro_sync.upsert_events = timed_upsert
+            keitaro_sync.SYNC_DAYS = int((time.time() - time.mktime(time.strptime(args.date_from, "%Y-%m-%d"))) // 86400) + 1
+
+            for label in ("sync_cold", "sync_warm"):
+                conn = keitaro_sync.get_db_connection()
+                cur = conn.cursor()
+                cur.execute("DELETE FROM keitaro_sync_state WHERE campaign_id = %s", (args.campaign,))
+                if label == "sync_cold":
+                    cur.execute("DELETE FROM keitaro_events WHERE campaign_id = %s", (args.campaign,))
+                conn.commit()
+                cur.close()
+                conn.close()
+
+                write_times.clear()
+                started = time.perf_counter()
+                keitaro_sync.sync_campaign(args.campaign)
+                results[f"{label}_seconds"] = round(time.perf_counter() - started, 3)
+                # No upsert happens when the sync finds no rows
+                results[f"{label}_db_write_seconds"] = round(sum(write_times), 3)
+
+            results["sync_peak_rss_mb"] = round(peak_rss_mb(), 1)
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        print()
+        for key, value in results.items():
+            print(f"{key:>28}: {value}")
+
+
+if __name__ == "__main__":
+    main()
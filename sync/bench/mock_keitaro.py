@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Mock Keitaro Admin API for offline benchmarks
+Serves /conversions/log, /report/build and /campaigns with generated data
+"""
+
+import json
+import time
+import random
+import argparse
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+EVENT_TYPES = ["reg", "dep", "ftd", "redep", "", " "]
+STATUSES = ["lead", "sale", "rejected"]
+
+
+class MockData:
+    """Deterministic conversions spread evenly over a date range
+
+    Row i is computed on demand, so millions of rows cost no memory and
+    rows are already sorted by datetime and conversion id.
+    """
+
+    def __init__(self, rows, date_from, date_to, campaigns):
+        self.rows = rows
+        self.start = datetime.strptime(date_from, "%Y-%m-%d")
+        self.span = (datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1) - self.start).total_seconds()
+        self.campaigns = campaigns
+        self._report = None
+
+    def datetime_at(self, i):
+        """Get datetime string of row i"""
+        return f"{self.start + timedelta(seconds=int(i * self.span / self.rows)):%Y-%m-%d %H:%M:%S}"
+
+    def row(self, i):
+        """Get row i"""
+        rnd = random.Random(i)
+        return {
+            "conversion_id": str(i + 1),
+            "datetime": self.datetime_at(i),
+            "sub_id_2": rnd.choice(EVENT_TYPES),
+            "revenue": f"{rnd.random() * 50:.2f}",
+            "status": rnd.choice(STATUSES),
+        }
+
+    def index_of(self, dt):
+        """Get index of the first row at or after a datetime string"""
+        return bisect_left(range(self.rows), dt, key=self.datetime_at)
+
+    def report(self):
+        """Get conversions and revenue grouped by day and sub_id_2"""
+        if self._report is None:
+            grouped = defaultdict(lambda: {"conversions": 0, "revenue": 0.0})
+            for i in range(self.rows):
+                row = self.row(i)
+                group = grouped[(row["datetime"][:10], row["sub_id_2"])]
+                group["conversions"] += 1
+                group["revenue"] += float(row["revenue"])
+            self._report = grouped
+        return self._report
+
+
+def make_handler(data, latency, error_rate):
+    """Build a request handler bound to mock data and failure settings"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, obj, status=200):
+            body = json.dumps(obj).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def simulate(self):
+            """Apply latency and injected errors; returns True if an error was sent"""
+            if latency:
+                time.sleep(latency)
+            if error_rate and random.random() < error_rate:
+                self.send_response(random.choice([429, 500, 503]))
+                self.send_header("Retry-After", "0")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return True
+            return False
+
+        def do_GET(self):
+            if self.simulate():
+                return
+
+            parts = self.path.rstrip("/").split("/")
+            if self.path.rstrip("/") == "/admin_api/v1/campaigns":
+                return self.send_json([{"id": c, "name": f"Mock campaign {c}"} for c in data.campaigns])
+            if len(parts) == 5 and parts[3] == "campaigns" and parts[4].isdigit():
+                return self.send_json({"id": int(parts[4]), "name": f"Mock campaign {parts[4]}"})
+            self.send_json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.simulate():
+                return
+
+            if self.path == "/admin_api/v1/conversions/log":
+                return self.send_json(self.conversions_log(payload))
+            if self.path == "/admin_api/v1/report/build":
+                return self.send_json(self.report_build(payload))
+            self.send_json({"error": "not found"}, 404)
+
+        def conversions_log(self, payload):
+            # Range and datetime filters narrow [lo, hi) over the sorted rows
+            lo = data.index_of(payload["range"]["from"])
+            hi = data.index_of(f"{datetime.strptime(payload['range']['to'][:10], '%Y-%m-%d') + timedelta(days=1):%Y-%m-%d}")
+            for f in payload.get("filters", []):
+                if f["name"] != "datetime":
+                    continue
+                if f["operator"] in ("GREATER_THAN_OR_EQUAL", "GREATER_THAN"):
+                    lo = max(lo, data.index_of(f["expression"]))
+                elif f["operator"] == "LESS_THAN":
+                    hi = min(hi, data.index_of(f["expression"]))
+
+            total = max(0, hi - lo)
+            indexes = range(lo, hi)
+            if payload.get("sort", {}).get("order") == "DESC":
+                indexes = indexes[::-1]
+
+            offset = payload.get("offset", 0)
+            columns = payload.get("columns") or ["datetime", "sub_id_2", "revenue", "status"]
+            rows = []
+            for i in indexes[offset:offset + payload.get("limit", 100)]:
+                row = data.row(i)
+                rows.append({c: row.get(c) for c in columns})
+            return {"rows": rows, "total": total}
+
+        def report_build(self, payload):
+            date_from = payload["range"]["from"][:10]
+            date_to = payload["range"]["to"][:10]
+            rows = [
+                {"day": day, "sub_id_2": event_type, "conversions": g["conversions"], "revenue": round(g["revenue"], 2)}
+                for (day, event_type), g in data.report().items()
+                if date_from <= day <= date_to
+            ]
+            return {"rows": rows[:payload.get("limit", 10000)], "total": len(rows)}
+
+    return Handler
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Mock Keitaro Admin API")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--rows", type=int, default=100000, help="conversions in the range")
+    parser.add_argument("--from", dest="date_from", default="2026-01-01")
+    parser.add_argument("--to", dest="date_to", default="2026-01-30")
+    parser.add_argument("--latency-ms", type=float, default=0, help="added to every response")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of requests answered 429/5xx")
+    parser.add_argument("--campaigns", default="12", help="comma-separated campaign ids")
+    args = parser.parse_args()
+
+    data = MockData(args.rows, args.date_from, args.date_to, [int(c) for c in args.campaigns.split(",")])
+    handler = make_handler(data, args.latency_ms / 1000, args.error_rate)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), handler)
+    print(f"Mock Keitaro on http://127.0.0.1:{args.port} with {args.rows} rows", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
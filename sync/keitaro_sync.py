@@ -5,12 +5,27 @@ Fetches event logs from Keitaro API and stores in PostgreSQL
 """
 
 import os
+import re
+import sys
+import json
+import argparse
+import io
+import csv
 import time
+import random
 import requests
+from requests.adapters import HTTPAdapter
 import psycopg2
-from psycopg2.extras import execute_values
-from datetime import datetime, timedelta
+from psycopg2.extras import execute_values, Json
+from datetime import datetime, timedelta, timezone
 import logging
+import threading
+from email.utils import parsedate_to_datetime
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+import multiprocessing
+from itertools import chain, islice
+from operator import itemgetter
 
 logging.basicConfig(
     level=logging.INFO,
@@ -22,8 +37,297 @@ logger = logging.getLogger(__name__)
 KEITARO_URL = os.environ.get("KEITARO_URL", "https://kt.dmnd.team")
 KEITARO_API_KEY = os.environ.get("KEITARO_API_KEY")
 DATABASE_URL = os.environ.get("DATABASE_URL")
-SYNC_INTERVAL = int(os.environ.get("SYNC_INTERVAL", 300))  # 5 minutes
+SYNC_INTERVAL = int(os.environ.get("SYNC_INTERVAL", 300))  # 5 minutes, starting interval per campaign
+SYNC_MIN_INTERVAL = int(os.environ.get("SYNC_MIN_INTERVAL", 60))  # busiest campaigns
+SYNC_MAX_INTERVAL = int(os.environ.get("SYNC_MAX_INTERVAL", 1800))  # idle campaigns
+SCHEDULER_TICK = int(os.environ.get("SCHEDULER_TICK", 10))  # seconds between schedule checks
 CAMPAIGN_IDS = os.environ.get("CAMPAIGN_IDS", "12").split(",")  # Topacio campaign
+FETCH_CONCURRENCY = int(os.environ.get("FETCH_CONCURRENCY", 4))  # parallel page requests
+PAGINATION = os.environ.get("PAGINATION", "offset")  # "offset" or "keyset" (adaptive time windows)
+KEYSET_WINDOW_MINUTES = int(os.environ.get("KEYSET_WINDOW_MINUTES", 60))  # first keyset window
+BACKFILL_WORKERS = int(os.environ.get("BACKFILL_WORKERS", 4))  # processes for the backfill command
+COLUMNAR_BUFFER_ROWS = int(os.environ.get("COLUMNAR_BUFFER_ROWS", 20000))  # rows per vectorized fold, 0 = row loop
+SYNC_DAYS = int(os.environ.get("SYNC_DAYS", 30))  # window for campaigns without a watermark
+SYNC_LOOKBACK_MINUTES = int(os.environ.get("SYNC_LOOKBACK_MINUTES", 360))  # late-arriving conversions
+FETCH_MODE = os.environ.get("FETCH_MODE", "log")  # "log" (raw rows) or "report" (grouped by Keitaro)
+REPORT_CHECK_TOLERANCE = float(os.environ.get("REPORT_CHECK_TOLERANCE", 0))  # allowed relative mismatch
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 10))  # keep-alive connections to Keitaro
+PAGE_SIZE = int(os.environ.get("PAGE_SIZE", 500))  # first conversions/log page size, tuned at runtime
+PAGE_SIZE_MIN = int(os.environ.get("PAGE_SIZE_MIN", 100))  # tuning bounds, equal values disable tuning
+PAGE_SIZE_MAX = int(os.environ.get("PAGE_SIZE_MAX", 10000))
+PAGE_SIZE_SAMPLES = int(os.environ.get("PAGE_SIZE_SAMPLES", 8))  # pages measured before each step
+PAGE_SIZE_HOLD = int(os.environ.get("PAGE_SIZE_HOLD", 10))  # steps to wait after backing off
+JSON_STREAM_ROWS = int(os.environ.get("JSON_STREAM_ROWS", 0))  # stream pages of this many rows or more, 0 = never
+KEITARO_RPS = float(os.environ.get("KEITARO_RPS", 10))  # client-side request rate limit, 0 = unlimited
+KEITARO_MAX_RETRIES = int(os.environ.get("KEITARO_MAX_RETRIES", 5))  # per request
+KEITARO_BACKOFF = float(os.environ.get("KEITARO_BACKOFF", 1.0))  # base backoff, seconds
+KEITARO_BACKOFF_MAX = float(os.environ.get("KEITARO_BACKOFF_MAX", 60.0))  # backoff cap, seconds
+COPY_THRESHOLD = int(os.environ.get("COPY_THRESHOLD", 1000))  # rows above which COPY is used
+SYNC_CONCURRENCY = int(os.environ.get("SYNC_CONCURRENCY", 4))  # campaigns synced at once
+CAMPAIGN_TIMEOUT = int(os.environ.get("CAMPAIGN_TIMEOUT", 600))  # seconds per campaign
+CAMPAIGN_CACHE_TTL = int(os.environ.get("CAMPAIGN_CACHE_TTL", 3600))  # campaign names refresh, seconds
+RAW_SINK = os.environ.get("RAW_SINK", "false").lower() == "true"  # store every conversion row
+RAW_RETENTION_MONTHS = int(os.environ.get("RAW_RETENTION_MONTHS", 0))  # detach older partitions, 0 = keep all
+DROP_CAMPAIGN_NAME = os.environ.get("DROP_CAMPAIGN_NAME", "false").lower() == "true"  # drop legacy keitaro_events.campaign_name
+
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 9108))  # Prometheus /metrics, 0 = disabled
+
+SUPERSET_BROKER_URL = os.environ.get("SUPERSET_BROKER_URL")  # Superset's Celery broker, unset = no warm-up
+CACHE_WARMUP_TOP_N = int(os.environ.get("CACHE_WARMUP_TOP_N", 10))  # most viewed dashboards to warm
+CACHE_WARMUP_MIN_INTERVAL = int(os.environ.get("CACHE_WARMUP_MIN_INTERVAL", 900))  # seconds between warm-ups
+
+# Keitaro reports in Europe/Moscow, which has no DST
+KEITARO_TZ = timezone(timedelta(hours=3))
+
+try:
+    import brotli  # noqa: F401 - lets urllib3 decode br responses
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    from celery import Celery
+except ImportError:
+    Celery = None
+
+
+class NoopMetric:
+    """Stand-in for Prometheus metrics when prometheus_client is not installed"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, *args, **kwargs):
+        pass
+
+    observe = set = set_function = inc
+
+
+def metric(kind, name, documentation, labelnames=(), **kwargs):
+    """Create a Prometheus metric, or a no-op one without prometheus_client"""
+    if prometheus_client is None:
+        return NoopMetric()
+    return getattr(prometheus_client, kind)(name, documentation, labelnames, **kwargs)
+
+
+SYNC_DURATION = metric(
+    "Histogram", "keitaro_sync_campaign_duration_seconds", "Campaign sync duration",
+    ["campaign_id", "status"], buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+SYNC_ROWS = metric(
+    "Counter", "keitaro_sync_rows_total", "keitaro_events rows by upsert result",
+    ["campaign_id", "result"]
+)
+SYNC_LAST_SUCCESS = metric(
+    "Gauge", "keitaro_sync_last_success_timestamp_seconds", "Unix time of the last successful sync",
+    ["campaign_id"]
+)
+WATERMARK_AGE = metric(
+    "Gauge", "keitaro_sync_watermark_age_seconds", "Age of the last successfully synced conversion",
+    ["campaign_id"]
+)
+PAGES_FETCHED = metric(
+    "Counter", "keitaro_api_pages_fetched_total", "Conversion log pages fetched",
+    ["campaign_id"]
+)
+API_LATENCY = metric(
+    "Histogram", "keitaro_api_request_duration_seconds", "Keitaro API request latency",
+    ["endpoint"], buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+API_BYTES = metric(
+    "Counter", "keitaro_api_response_bytes_total", "Bytes downloaded from Keitaro API",
+    ["endpoint"]
+)
+API_RETRIES = metric(
+    "Counter", "keitaro_api_retries_total", "Keitaro API request retries",
+    ["endpoint", "reason"]
+)
+API_PAGE_SIZE = metric(
+    "Gauge", "keitaro_api_page_size", "Current tuned page size",
+    ["endpoint"]
+)
+
+_watermarks = {}
+
+
+def set_watermark_age(campaign_id, watermark):
+    """Track a campaign's watermark for the age gauge"""
+    if isinstance(watermark, str):
+        watermark = datetime.strptime(watermark[:19], "%Y-%m-%d %H:%M:%S")
+
+    if campaign_id not in _watermarks:
+        WATERMARK_AGE.labels(str(campaign_id)).set_function(
+            lambda: (datetime.now(KEITARO_TZ).replace(tzinfo=None) - _watermarks[campaign_id]).total_seconds()
+        )
+    _watermarks[campaign_id] = watermark
+
+
+class KeitaroFetchError(Exception):
+    """Raised when a fetch could not return every conversion"""
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing rate requests per second"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        if self.rate <= 0:
+            return
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+def parse_retry_after(value):
+    """Get Retry-After header value in seconds, or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def iter_json_items(response, prefix, chunk_size=1000):
+    """Yield lists of up to chunk_size JSON items found at prefix
+
+    Items are parsed by ijson while the body is read off the socket, so
+    neither the raw body nor all of its items are ever held in memory.
+    The response is closed when the generator finishes or is discarded.
+    """
+    response.raw.decode_content = True
+    with response:
+        items = ijson.items(response.raw, prefix, use_float=True)
+        while chunk := list(islice(items, chunk_size)):
+            yield chunk
+
+
+class KeitaroClient:
+    """Keitaro Admin API client sharing one pooled keep-alive session
+
+    Requests are rate limited client-side and retried on network errors,
+    HTTP 429 and 5xx with jittered exponential backoff, honoring
+    Retry-After when the server sends it.
+    """
+
+    def __init__(self, url, api_key, pool_size=10, rps=0):
+        self.url = url.rstrip("/")
+        self.bucket = TokenBucket(rps)
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Api-Key": api_key or "",
+            "Accept-Encoding": ACCEPT_ENCODING
+        })
+
+        # pool_block caps in-flight requests across all campaigns at pool_size
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method, path, stream=False, fail_fast=False, **kwargs):
+        """Send a request with retries and return decoded JSON
+
+        With stream, the response is returned with its body still unread
+        once the status is OK, to be decoded with iter_json_items. Only
+        the request itself is retried then, not a failure mid-body.
+        With fail_fast, timeouts and 5xx are raised at once for callers
+        that retry with a smaller request; 429 is still retried.
+        """
+        endpoint = re.sub(r"/\d+", "/{id}", path)
+
+        for attempt in range(KEITARO_MAX_RETRIES + 1):
+            self.bucket.acquire()
+            delay = None
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, f"{self.url}{path}", stream=stream, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+                reason = type(e).__name__
+            else:
+                API_LATENCY.labels(endpoint).observe(time.monotonic() - started)
+                # Content-Length is the on-the-wire (compressed) size when present
+                size = response.headers.get("Content-Length")
+                if size or not stream:
+                    API_BYTES.labels(endpoint).inc(int(size or len(response.content)))
+                if response.status_code != 429 and response.status_code < 500:
+                    response.raise_for_status()
+                    return response if stream else json_loads(response.content)
+                response.close()
+                error = requests.HTTPError(f"HTTP {response.status_code}", response=response)
+                reason = str(response.status_code)
+                delay = parse_retry_after(response.headers.get("Retry-After"))
+
+            if attempt == KEITARO_MAX_RETRIES:
+                raise error
+            if fail_fast and (isinstance(error, requests.Timeout) or reason.startswith("5")):
+                raise error
+            API_RETRIES.labels(endpoint, reason).inc()
+
+            # Full jitter keeps parallel workers from retrying in lockstep
+            if delay is None:
+                delay = random.uniform(0, min(KEITARO_BACKOFF_MAX, KEITARO_BACKOFF * 2 ** attempt))
+            logger.warning(
+                f"Keitaro {method} {path} failed ({error}), "
+                f"retry {attempt + 1}/{KEITARO_MAX_RETRIES} in {delay:.1f}s"
+            )
+            time.sleep(delay)
+
+    def get(self, path, timeout=30):
+        """GET an API path and return decoded JSON"""
+        return self.request("GET", path, timeout=timeout)
+
+    def post(self, path, payload, timeout=60, stream=False, fail_fast=False):
+        """POST a JSON payload to an API path and return decoded JSON"""
+        return self.request("POST", path, json=payload, timeout=timeout, stream=stream, fail_fast=fail_fast)
+
+
+keitaro = KeitaroClient(
+    KEITARO_URL,
+    KEITARO_API_KEY,
+    pool_size=max(HTTP_POOL_SIZE, FETCH_CONCURRENCY),
+    rps=KEITARO_RPS
+)
 
 
 def get_db_connection():
@@ -41,7 +345,6 @@ def init_database():
         CREATE TABLE IF NOT EXISTS keitaro_events (
             id SERIAL PRIMARY KEY,
             campaign_id INTEGER,
-            campaign_name VARCHAR(255),
             date DATE,
             event_type VARCHAR(100),
             event_count INTEGER DEFAULT 0,
@@ -66,84 +369,772 @@ def init_database():
         ON keitaro_events(event_type)
     """)
 
+    # Campaign metadata, kept once per campaign instead of on every event row
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS keitaro_campaigns (
+            campaign_id INTEGER PRIMARY KEY,
+            name VARCHAR(255),
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Migrate names out of keitaro_events from older deployments. Until
+    # DROP_CAMPAIGN_NAME is set the old column stays, filled from
+    # keitaro_campaigns by a trigger, so existing charts keep working while
+    # they are moved to keitaro_events_named.
+    cur.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'keitaro_events' AND column_name = 'campaign_name'
+    """)
+    if cur.fetchone():
+        cur.execute("""
+            INSERT INTO keitaro_campaigns (campaign_id, name, updated_at)
+            SELECT DISTINCT ON (campaign_id) campaign_id, campaign_name, 'epoch'
+            FROM keitaro_events
+            WHERE campaign_name IS NOT NULL
+            ORDER BY campaign_id, updated_at DESC
+            ON CONFLICT (campaign_id) DO NOTHING
+        """)
+        if DROP_CAMPAIGN_NAME:
+            cur.execute("DROP TRIGGER IF EXISTS keitaro_events_campaign_name ON keitaro_events")
+            cur.execute("DROP FUNCTION IF EXISTS keitaro_events_campaign_name()")
+            cur.execute("ALTER TABLE keitaro_events DROP COLUMN campaign_name")
+            logger.info("Dropped keitaro_events.campaign_name, names are in keitaro_campaigns")
+        else:
+            cur.execute("""
+                CREATE OR REPLACE FUNCTION keitaro_events_campaign_name() RETURNS trigger AS $$
+                BEGIN
+                    NEW.campaign_name := (SELECT name FROM keitaro_campaigns WHERE campaign_id = NEW.campaign_id);
+                    RETURN NEW;
+                END
+                $$ LANGUAGE plpgsql
+            """)
+            cur.execute("DROP TRIGGER IF EXISTS keitaro_events_campaign_name ON keitaro_events")
+            cur.execute("""
+                CREATE TRIGGER keitaro_events_campaign_name
+                BEFORE INSERT OR UPDATE ON keitaro_events
+                FOR EACH ROW EXECUTE FUNCTION keitaro_events_campaign_name()
+            """)
+            logger.warning(
+                "keitaro_events.campaign_name is deprecated, use keitaro_events_named; "
+                "set DROP_CAMPAIGN_NAME=true once no chart uses it"
+            )
+
+    # Events with campaign name for dashboards
+    cur.execute("""
+        CREATE OR REPLACE VIEW keitaro_events_named AS
+        SELECT e.id, e.campaign_id, c.name AS campaign_name, e.date,
+               e.event_type, e.event_count, e.created_at, e.updated_at
+        FROM keitaro_events e
+        LEFT JOIN keitaro_campaigns c ON c.campaign_id = e.campaign_id
+    """)
+
+    # Per-campaign sync watermark (latest conversion datetime, Keitaro timezone)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS keitaro_sync_state (
+            campaign_id INTEGER PRIMARY KEY,
+            watermark TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Tuned page size per API endpoint, reused after a restart
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS keitaro_page_sizes (
+            endpoint VARCHAR(100) PRIMARY KEY,
+            page_size INTEGER,
+            seconds_per_row DOUBLE PRECISION,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Backfill checkpoints: one row per (campaign, shard), with the shard's counts
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS keitaro_backfill_shards (
+            campaign_id INTEGER,
+            shard_start TIMESTAMP,
+            shard_end TIMESTAMP,
+            status VARCHAR(20),
+            conversions INTEGER DEFAULT 0,
+            counts JSONB,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (campaign_id, shard_start, shard_end)
+        )
+    """)
+
+    # Raw conversion rows, partitioned by month (partitions created on demand)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS keitaro_conversions (
+            conversion_id VARCHAR(64) NOT NULL,
+            campaign_id INTEGER,
+            datetime TIMESTAMP NOT NULL,
+            sub_id_2 VARCHAR(255),
+            revenue NUMERIC(14, 4),
+            status VARCHAR(50),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (conversion_id, datetime)
+        ) PARTITION BY RANGE (datetime)
+    """)
+
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_keitaro_conversions_campaign_datetime
+        ON keitaro_conversions(campaign_id, datetime)
+    """)
+
+    # Pre-aggregated rollups at hour, day, ISO week and month grain
+    for table in ROLLUPS:
+        bucket_type = "TIMESTAMP" if table == "keitaro_events_hourly" else "DATE"
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                campaign_id INTEGER,
+                bucket {bucket_type},
+                event_type VARCHAR(100),
+                event_count INTEGER DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (campaign_id, bucket, event_type)
+            )
+        """)
+        cur.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_{table}_bucket
+            ON {table}(bucket)
+        """)
+
+        # Seed a new rollup from everything already synced
+        cur.execute(f"SELECT 1 FROM {table} LIMIT 1")
+        if not cur.fetchone():
+            source, _, bucket, event_type, count = ROLLUPS[table]
+            cur.execute(f"""
+                INSERT INTO {table} (campaign_id, bucket, event_type, event_count)
+                SELECT campaign_id, {bucket}, {event_type}, {count}
+                FROM {source}
+                GROUP BY 1, 2, 3
+            """)
+
     conn.commit()
     cur.close()
     conn.close()
     logger.info("Database initialized")
 
 
-def fetch_keitaro_data(campaign_id, date_from, date_to):
-    """Fetch conversion logs from Keitaro API using /conversions/log endpoint"""
-    from collections import defaultdict
+_conversion_partitions = set()
+_conversion_partitions_lock = threading.Lock()
 
-    headers = {
-        "Api-Key": KEITARO_API_KEY,
-        "Content-Type": "application/json"
-    }
 
-    all_rows = []
-    offset = 0
-    limit = 500
-    total = None
+def month_start(day):
+    """Get first day of the month as a date"""
+    return day.replace(day=1)
 
-    while True:
-        payload = {
-            "range": {
-                "from": date_from,
-                "to": date_to,
-                "timezone": "Europe/Moscow"
+
+def next_month(day):
+    """Get first day of the following month as a date"""
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def get_months(date_from, date_to):
+    """Get first days of the months an inclusive YYYY-MM-DD range touches"""
+    month = month_start(datetime.strptime(date_from, "%Y-%m-%d").date())
+    last = datetime.strptime(date_to, "%Y-%m-%d").date()
+    months = []
+    while month <= last:
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def get_retention_cutoff():
+    """Get the oldest month kept in keitaro_conversions, None if all are kept"""
+    if RAW_RETENTION_MONTHS <= 0:
+        return None
+
+    cutoff = month_start(datetime.now(KEITARO_TZ).date())
+    for _ in range(RAW_RETENTION_MONTHS - 1):
+        cutoff = month_start(cutoff - timedelta(days=1))
+    return cutoff
+
+
+def ensure_conversion_partitions(months):
+    """Create monthly keitaro_conversions partitions that do not exist yet
+
+    Must run before the caller's transaction writes to keitaro_conversions:
+    creating a partition locks the parent exclusively and would wait on
+    that transaction forever. Months past RAW_RETENTION_MONTHS are skipped,
+    their detached tables still hold the partition names.
+    """
+    cutoff = get_retention_cutoff()
+    missing = [m for m in months if m not in _conversion_partitions and (cutoff is None or m >= cutoff)]
+    if not missing:
+        return
+
+    # Own autocommit connection so concurrent campaign syncs never race on DDL
+    with _conversion_partitions_lock:
+        conn = get_db_connection()
+        conn.autocommit = True
+        cur = conn.cursor()
+        for month in sorted(set(missing)):
+            if month in _conversion_partitions:
+                continue
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS keitaro_conversions_{month:%Y_%m}
+                PARTITION OF keitaro_conversions
+                FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month(month):%Y-%m-%d}')
+            """)
+            _conversion_partitions.add(month)
+        cur.close()
+        conn.close()
+
+
+def detach_old_conversion_partitions():
+    """Detach keitaro_conversions partitions older than RAW_RETENTION_MONTHS
+
+    Detached tables keep their data and can be archived or dropped separately.
+    CONCURRENTLY lets syncs keep inserting while a partition is detached.
+    """
+    cutoff = get_retention_cutoff()
+    if cutoff is None:
+        return
+
+    # DETACH ... CONCURRENTLY cannot run inside a transaction block
+    conn = get_db_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = 'keitaro_conversions'
+    """)
+    for (name,) in cur.fetchall():
+        month = datetime.strptime(name[-7:], "%Y_%m").date()
+        if month < cutoff:
+            with _conversion_partitions_lock:
+                _conversion_partitions.discard(month)
+            cur.execute(f"ALTER TABLE keitaro_conversions DETACH PARTITION {name} CONCURRENTLY")
+            logger.info(f"Detached partition {name}")
+    cur.close()
+    conn.close()
+
+
+def store_conversions(cur, campaign_id, rows):
+    """Upsert raw conversion rows into keitaro_conversions, deduplicated on conversion id
+
+    Partitions must already exist (ensure_conversion_partitions). Rows
+    past RAW_RETENTION_MONTHS are dropped, rows of other missing months
+    are skipped with a warning.
+    """
+    cutoff = get_retention_cutoff()
+    values = {}
+    skipped = 0
+    for row in rows:
+        conversion_id = row.get("conversion_id")
+        dt = row.get("datetime")
+        if not conversion_id or not dt:
+            continue
+        month = month_start(datetime.strptime(dt[:10], "%Y-%m-%d").date())
+        if cutoff is not None and month < cutoff:
+            continue
+        if month not in _conversion_partitions:
+            skipped += 1
+            continue
+        revenue = row.get("revenue")
+        values[(str(conversion_id), dt)] = (
+            str(conversion_id),
+            campaign_id,
+            dt,
+            row.get("sub_id_2"),
+            float(revenue) if revenue not in (None, "") else None,
+            row.get("status")
+        )
+
+    if skipped:
+        logger.warning(f"Skipped {skipped} raw conversions of campaign {campaign_id} without a partition")
+    if not values:
+        return
+
+    execute_values(
+        cur,
+        """
+        INSERT INTO keitaro_conversions
+        (conversion_id, campaign_id, datetime, sub_id_2, revenue, status)
+        VALUES %s
+        ON CONFLICT (conversion_id, datetime)
+        DO UPDATE SET
+            sub_id_2 = EXCLUDED.sub_id_2,
+            revenue = EXCLUDED.revenue,
+            status = EXCLUDED.status,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE (keitaro_conversions.sub_id_2, keitaro_conversions.revenue, keitaro_conversions.status)
+            IS DISTINCT FROM (EXCLUDED.sub_id_2, EXCLUDED.revenue, EXCLUDED.status)
+        """,
+        list(values.values())
+    )
+
+
+class PageSizeTuner:
+    """Page size of one API endpoint, hill-climbed between fetches
+
+    Pages at least half full report their rows and wall time, which
+    includes rate limit and retry waits. After PAGE_SIZE_SAMPLES pages
+    the size doubles if seconds per row improved by 5% over the previous
+    size, otherwise it steps back and holds for PAGE_SIZE_HOLD steps
+    before probing again. A timeout, 413 or 5xx halves it right away,
+    and a short page with more rows left caps it at the server's maximum.
+    The size is kept in keitaro_page_sizes so restarts resume from it.
+    """
+
+    def __init__(self, endpoint, initial=PAGE_SIZE, low=PAGE_SIZE_MIN, high=PAGE_SIZE_MAX):
+        self.endpoint = endpoint
+        self.low = low
+        self.high = max(low, high)
+        self.limit = min(self.high, max(low, initial))
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.pages = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self.previous = None  # (limit, seconds per row) before the last step up
+        self.per_row = None
+        self.hold = 0
+
+    def get(self):
+        """Get the page size to use for the next fetch"""
+        with self.lock:
+            if not self.loaded:
+                self.loaded = True
+                self.load()
+            return self.limit
+
+    def observe(self, limit, rows, seconds):
+        """Record one page fetched with a given limit"""
+        with self.lock:
+            if limit == self.limit and rows * 2 >= limit:
+                self.pages += 1
+                self.rows += rows
+                self.seconds += seconds
+
+    def shrink(self, limit):
+        """Halve the page size after a request with this limit failed"""
+        with self.lock:
+            if limit != self.limit or limit == self.low:
+                return
+            self.set(max(self.low, limit // 2))
+            self.previous = None
+            self.hold = PAGE_SIZE_HOLD
+        logger.warning(f"Page size for {self.endpoint} reduced to {self.limit} after a failed request")
+        self.save()
+
+    def cap(self, limit, rows):
+        """Limit the page size to rows after a request for limit returned fewer with more left"""
+        with self.lock:
+            if rows >= self.high:
+                return
+            self.high = max(self.low, rows)
+            self.set(min(self.limit, self.high))
+            self.previous = None
+        logger.warning(f"Keitaro returned {rows} of {limit} requested rows, page size for {self.endpoint} capped at {self.limit}")
+        self.save()
+
+    def settle(self):
+        """Take a tuning step once enough pages have been measured"""
+        with self.lock:
+            if self.pages < PAGE_SIZE_SAMPLES or self.low == self.high:
+                return
+            per_row = self.seconds / self.rows
+            limit = self.limit
+
+            if self.previous is not None and per_row > self.previous[1] * 0.95:
+                self.set(self.previous[0])
+                self.previous = None
+                self.hold = PAGE_SIZE_HOLD
+            elif self.hold:
+                self.hold -= 1
+                self.set(limit)
+            elif limit < self.high:
+                self.previous = (limit, per_row)
+                self.set(min(self.high, limit * 2))
+            else:
+                self.set(limit)
+            self.per_row = per_row
+
+        if self.limit != limit:
+            logger.info(
+                f"Page size for {self.endpoint}: {limit} -> {self.limit} "
+                f"({per_row * 1000:.3f} ms/row at {limit})"
+            )
+            self.save()
+
+    def set(self, limit):
+        """Switch to a page size and start measuring it afresh"""
+        self.limit = limit
+        self.pages = 0
+        self.rows = 0
+        self.seconds = 0.0
+        API_PAGE_SIZE.labels(self.endpoint).set(limit)
+
+    def load(self):
+        """Resume from the stored page size, if any"""
+        if not DATABASE_URL:
+            return
+        try:
+            conn = get_db_connection()
+            cur = conn.cursor()
+            cur.execute("SELECT page_size FROM keitaro_page_sizes WHERE endpoint = %s", (self.endpoint,))
+            row = cur.fetchone()
+            cur.close()
+            conn.close()
+        except psycopg2.Error as e:
+            logger.warning(f"Could not load page size for {self.endpoint}: {e}")
+            return
+        if row:
+            self.set(min(self.high, max(self.low, row[0])))
+
+    def save(self):
+        """Store the current page size"""
+        if not DATABASE_URL:
+            return
+        try:
+            conn = get_db_connection()
+            cur = conn.cursor()
+            cur.execute(
+                """
+                INSERT INTO keitaro_page_sizes (endpoint, page_size, seconds_per_row)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (endpoint)
+                DO UPDATE SET
+                    page_size = EXCLUDED.page_size,
+                    seconds_per_row = COALESCE(EXCLUDED.seconds_per_row, keitaro_page_sizes.seconds_per_row),
+                    updated_at = CURRENT_TIMESTAMP
+                """,
+                (self.endpoint, self.limit, self.per_row)
+            )
+            conn.commit()
+            cur.close()
+            conn.close()
+        except psycopg2.Error as e:
+            logger.warning(f"Could not save page size for {self.endpoint}: {e}")
+
+
+conversions_page_size = PageSizeTuner("/admin_api/v1/conversions/log")
+
+
+def fetch_conversions_page(campaign_id, date_from, date_to, offset, limit, sort=None, filters=(), stream=False):
+    """Fetch a single page of conversion logs from Keitaro API
+
+    With stream, returns the open response for iter_json_items instead.
+    A page that times out or gets a 5xx shrinks the tuned page size and,
+    unless streamed or already at PAGE_SIZE_MIN, is fetched again as two
+    half pages instead of retrying the same oversized request.
+    """
+    payload = {
+        "range": {
+            "from": date_from,
+            "to": date_to,
+            "timezone": "Europe/Moscow"
+        },
+        "columns": ["conversion_id", "datetime", "sub_id_2", "revenue", "status"],
+        "filters": [
+            {
+                "name": "campaign_id",
+                "operator": "EQUALS",
+                "expression": str(campaign_id)
             },
-            "columns": ["datetime", "sub_id_2", "revenue", "status"],
-            "filters": [
-                {
-                    "name": "campaign_id",
-                    "operator": "EQUALS",
-                    "expression": str(campaign_id)
-                }
-            ],
-            "limit": limit,
-            "offset": offset
-        }
+            *filters
+        ],
+        "limit": limit,
+        "offset": offset
+    }
+    if sort:
+        payload["sort"] = sort
+
+    splittable = not stream and limit // 2 >= conversions_page_size.low
+    started = time.monotonic()
+    try:
+        data = keitaro.post("/admin_api/v1/conversions/log", payload, stream=stream, fail_fast=splittable)
+    except (requests.Timeout, requests.HTTPError) as e:
+        status = e.response.status_code if e.response is not None else None
+        if not (isinstance(e, requests.Timeout) or status == 413 or (status or 0) >= 500):
+            raise
+        conversions_page_size.shrink(limit)
+        if not splittable:
+            raise
 
+        half = limit // 2
+        logger.warning(f"Conversions page at offset {offset} failed ({e}), fetching it as two pages of {half}")
+        data = fetch_conversions_page(campaign_id, date_from, date_to, offset, half, sort=sort, filters=filters)
+        rows = data.get("rows", [])
+        if len(rows) == half:
+            rest = fetch_conversions_page(
+                campaign_id, date_from, date_to, offset + half, limit - half, sort=sort, filters=filters
+            )
+            rows = rows + rest.get("rows", [])
+        return {**data, "rows": rows}
+
+    if not stream:
+        conversions_page_size.observe(limit, len(data.get("rows", [])), time.monotonic() - started)
+    return data
+
+
+def iter_streamed_pages(campaign_id, date_from, date_to, offsets, limit, filters=()):
+    """Yield conversion rows in offset order, decoded while they download
+
+    Pages are requested one at a time and their rows are yielded in small
+    chunks as ijson parses them, so memory stays flat however large limit
+    is, at the cost of the parallel prefetching in iter_conversion_pages.
+    Stops at the first empty page and raises KeitaroFetchError if a page
+    or its body fails.
+    """
+    for offset in offsets:
+        received = 0
         try:
-            response = requests.post(
-                f"{KEITARO_URL}/admin_api/v1/conversions/log",
-                headers=headers,
-                json=payload,
-                timeout=60
+            response = fetch_conversions_page(
+                campaign_id, date_from, date_to, offset, limit, filters=filters, stream=True
             )
-            response.raise_for_status()
-            data = response.json()
-            rows = data.get("rows", [])
+            for rows in iter_json_items(response, "rows.item"):
+                received += len(rows)
+                yield rows
+        except Exception as e:
+            raise KeitaroFetchError(f"Error fetching Keitaro data at offset {offset}: {e}") from e
+
+        if not received:
+            return
 
-            if total is None:
-                total = data.get("total", 0)
-                logger.info(f"Total conversions to fetch: {total}")
+
+def iter_conversion_pages(campaign_id, date_from, date_to, offsets, limit, filters=()):
+    """Yield pages of conversion rows in offset order, fetched in parallel
+
+    At most twice FETCH_CONCURRENCY pages are in flight or buffered, so
+    memory stays bounded however many pages there are. Each page is
+    retried on its own by the client, so a failure never refetches pages
+    already received. Stops at the first empty page and raises
+    KeitaroFetchError for a page that still fails. Pages of at least
+    JSON_STREAM_ROWS rows are streamed with iter_streamed_pages instead.
+    """
+    if ijson is not None and 0 < JSON_STREAM_ROWS <= limit:
+        yield from iter_streamed_pages(campaign_id, date_from, date_to, offsets, limit, filters=filters)
+        return
+
+    workers = max(1, FETCH_CONCURRENCY)
+    offsets = iter(offsets)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for offset in islice(offsets, workers * 2):
+            pending.append((offset, executor.submit(
+                fetch_conversions_page, campaign_id, date_from, date_to, offset, limit, filters=filters
+            )))
+
+        while pending:
+            offset, future = pending.popleft()
+            try:
+                rows = future.result().get("rows", [])
+            except Exception as e:
+                for _, future in pending:
+                    future.cancel()
+                raise KeitaroFetchError(f"Error fetching Keitaro data at offset {offset}: {e}") from e
 
             if not rows:
-                break
+                for _, future in pending:
+                    future.cancel()
+                return
 
-            all_rows.extend(rows)
-            logger.info(f"Fetched {len(all_rows)} / {total}")
+            for offset in islice(offsets, 1):
+                pending.append((offset, executor.submit(
+                    fetch_conversions_page, campaign_id, date_from, date_to, offset, limit, filters=filters
+                )))
 
-            offset += limit
-            if offset >= total:
-                break
+            yield rows
 
-        except Exception as e:
-            logger.error(f"Error fetching Keitaro data at offset {offset}: {e}")
-            break
 
-    # Aggregate by day and event_type
-    aggregated = defaultdict(lambda: defaultdict(int))
+def iter_keyset_pages(campaign_id, date_from, date_to, limit, filters=()):
+    """Yield pages of conversion rows by walking datetime windows in order
+
+    Each request covers a half-open [start, end) datetime window sorted by
+    datetime, so no deep offsets are needed and rows are never skipped or
+    duplicated between pages. The window is resized after every request
+    so that the next one returns close to limit rows. A window holding
+    more than limit rows is retried smaller; at one second it is paged
+    with offsets instead. Raises KeitaroFetchError on an incomplete window.
+    """
+    cursor = datetime.strptime(date_from, "%Y-%m-%d")
+    end = datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1)
+    window = timedelta(minutes=KEYSET_WINDOW_MINUTES)
+    sort = {"name": "datetime", "order": "ASC"}
+
+    while cursor < end:
+        window_end = min(cursor + window, end)
+        window_filters = (
+            *filters,
+            {"name": "datetime", "operator": "GREATER_THAN_OR_EQUAL", "expression": f"{cursor:%Y-%m-%d %H:%M:%S}"},
+            {"name": "datetime", "operator": "LESS_THAN", "expression": f"{window_end:%Y-%m-%d %H:%M:%S}"},
+        )
+
+        def fetch(offset):
+            try:
+                return fetch_conversions_page(
+                    campaign_id, date_from, date_to, offset, limit, sort=sort, filters=window_filters
+                )
+            except Exception as e:
+                raise KeitaroFetchError(f"Error fetching Keitaro data at {cursor}: {e}") from e
+
+        data = fetch(0)
+        total = data.get("total", 0)
+        rows = data.get("rows", [])
+        if rows and len(rows) < min(limit, total):
+            conversions_page_size.cap(limit, len(rows))
+            limit = len(rows)
+
+        if total > limit and window_end - cursor > timedelta(seconds=1):
+            # Too dense: retry the same start with a window sized for limit rows
+            window = max(timedelta(seconds=1), (window_end - cursor) * (limit * 0.9 / total))
+            continue
 
-    for row in all_rows:
+        if rows:
+            yield rows
+        fetched = len(rows)
+        while fetched < total and rows:
+            rows = fetch(fetched).get("rows", [])
+            fetched += len(rows)
+            yield rows
+
+        if fetched < total:
+            raise KeitaroFetchError(f"Fetched only {fetched} of {total} conversions at {cursor}")
+
+        # Aim the next window at ~90% of the limit, growing at most 4x per step
+        scale = min(4.0, max(0.5, limit * 0.9 / max(total, 1)))
+        window = max(timedelta(seconds=1), (window_end - cursor) * scale)
+        cursor = window_end
+
+
+def fold_conversions(aggregated, rows, latest=None):
+    """Add a page of conversion rows to running day -> sub_id_2 counts
+
+    Returns the latest conversion datetime seen so far.
+    """
+    for row in rows:
+        if latest is None or row.get("datetime", "") > latest:
+            latest = row.get("datetime", "")
         dt = row.get("datetime", "")[:10]  # Extract date part
         event_type = row.get("sub_id_2", "") or "unknown"
         if not event_type.strip():
             event_type = "unknown"
         aggregated[dt][event_type] += 1
 
+    return latest
+
+
+def fold_conversions_columnar(aggregated, rows, latest=None):
+    """Same as fold_conversions, but vectorized with NumPy
+
+    Columns are pulled out with C-level itemgetters, the YYYY-MM-DD digits
+    of the datetime column become one integer day code per row and every
+    (day, sub_id_2) pair is counted with a single bincount. Falls back to
+    the row loop if a row lacks either column or a datetime is not in
+    Keitaro's "YYYY-MM-DD ..." format.
+    """
+    if not rows:
+        return latest
+
+    try:
+        datetimes = list(map(itemgetter("datetime"), rows))
+        events = list(map(itemgetter("sub_id_2"), rows))
+    except KeyError:
+        return fold_conversions(aggregated, rows, latest)
+
+    raw = np.array(datetimes, dtype="S10").view(np.uint8).reshape(len(rows), 10)
+    digits = raw[:, [0, 1, 2, 3, 5, 6, 8, 9]].astype(np.int64) - ord("0")
+    if ((digits < 0) | (digits > 9)).any():
+        return fold_conversions(aggregated, rows, latest)
+
+    year = digits[:, :4] @ np.array([1000, 100, 10, 1])
+    month = digits[:, 4] * 10 + digits[:, 5]
+    days = (year * 13 + month) * 32 + digits[:, 6] * 10 + digits[:, 7]
+    first_day = int(days.min())
+
+    event_types = list(set(events))
+    event_index = {event: i for i, event in enumerate(event_types)}
+    event_codes = np.fromiter(map(event_index.__getitem__, events), dtype=np.int64, count=len(events))
+
+    counts = np.bincount((days - first_day) * len(event_types) + event_codes)
+    for code in np.flatnonzero(counts):
+        day, event = divmod(int(code), len(event_types))
+        day += first_day
+        dt = f"{day // (13 * 32):04d}-{day // 32 % 13:02d}-{day % 32:02d}"
+        event_type = event_types[event] or "unknown"
+        if not event_type.strip():
+            event_type = "unknown"
+        aggregated[dt][event_type] += int(counts[code])
+
+    page_latest = max(datetimes)
+    return page_latest if latest is None or page_latest > latest else latest
+
+
+def fetch_keitaro_data(campaign_id, date_from, date_to, sink=None, filters=()):
+    """Fetch conversion logs from Keitaro API using /conversions/log endpoint
+
+    Pages are folded into the counts as they arrive instead of being
+    buffered. If sink is given it is called with every page of raw rows.
+    Extra API filters narrow the fetch further than the date range.
+    Returns (rows, watermark). watermark is the latest conversion datetime
+    seen, or None when nothing was fetched. Raises KeitaroFetchError
+    rather than returning partial counts.
+    """
+    limit = conversions_page_size.get()
+
+    if PAGINATION == "keyset":
+        # Completeness is checked window by window
+        pages = iter_keyset_pages(campaign_id, date_from, date_to, limit, filters=filters)
+        total = 0
+    else:
+        # First page tells us the total, remaining pages are fetched in parallel
+        try:
+            data = fetch_conversions_page(campaign_id, date_from, date_to, 0, limit, filters=filters)
+        except Exception as e:
+            raise KeitaroFetchError(f"Error fetching Keitaro data at offset 0: {e}") from e
+
+        rows = data.get("rows", [])
+        total = data.get("total", 0)
+        logger.info(f"Total conversions to fetch: {total}")
+
+        # Fewer rows than asked for with more left: Keitaro caps the page size
+        if rows and len(rows) < min(limit, total):
+            conversions_page_size.cap(limit, len(rows))
+            limit = len(rows)
+
+        pages = [rows] if rows else []
+        if rows and limit < total:
+            pages = chain(pages, iter_conversion_pages(
+                campaign_id, date_from, date_to, range(limit, total, limit), limit, filters=filters
+            ))
+
+    # Aggregate by day and event_type
+    aggregated = defaultdict(lambda: defaultdict(int))
+    latest = None
+    fetched = 0
+
+    # With NumPy, pages are buffered and folded in vectorized batches
+    columnar = np is not None and COLUMNAR_BUFFER_ROWS > 0
+    buffer = []
+
+    for page in pages:
+        if sink is not None:
+            sink(page)
+        if columnar:
+            buffer.extend(page)
+            if len(buffer) >= COLUMNAR_BUFFER_ROWS:
+                latest = fold_conversions_columnar(aggregated, buffer, latest)
+                buffer = []
+        else:
+            latest = fold_conversions(aggregated, page, latest)
+        fetched += len(page)
+        PAGES_FETCHED.labels(str(campaign_id)).inc()
+        logger.info(f"Fetched {fetched} / {total or '?'}")
+
+    if buffer:
+        latest = fold_conversions_columnar(aggregated, buffer, latest)
+
+    conversions_page_size.settle()
+
     # Convert to list of dicts
     result = []
     for day, events in aggregated.items():
@@ -154,97 +1145,952 @@ def fetch_keitaro_data(campaign_id, date_from, date_to):
                 "conversions": count
             })
 
-    return result
+    # Partial counts would overwrite good data with smaller numbers
+    if fetched < total:
+        raise KeitaroFetchError(f"Fetched only {fetched} of {total} conversions")
 
-
-def get_campaign_name(campaign_id):
-    """Get campaign name from Keitaro"""
-    headers = {"Api-Key": KEITARO_API_KEY}
-    try:
-        response = requests.get(
-            f"{KEITARO_URL}/admin_api/v1/campaigns/{campaign_id}",
-            headers=headers,
-            timeout=30
-        )
-        response.raise_for_status()
-        return response.json().get("name", f"Campaign {campaign_id}")
-    except:
-        return f"Campaign {campaign_id}"
+    return result, latest
 
 
-def sync_campaign(campaign_id):
-    """Sync data for a specific campaign"""
-    logger.info(f"Syncing campaign {campaign_id}")
+def fetch_keitaro_report_data(campaign_id, date_from, date_to):
+    """Fetch conversions grouped by day and sub_id_2 from /report/build endpoint
 
-    # Get last 30 days of data
-    date_to = datetime.now().strftime("%Y-%m-%d")
-    date_from = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
+    The grouped numbers are cross-checked against the conversions/log total
+    and the raw-log path is used instead when they disagree.
+    Returns (rows, watermark) like fetch_keitaro_data.
+    """
+    payload = {
+        "range": {
+            "from": date_from,
+            "to": date_to,
+            "timezone": "Europe/Moscow"
+        },
+        "columns": [],
+        "metrics": ["conversions", "revenue"],
+        "grouping": ["day", "sub_id_2"],
+        "filters": [
+            {
+                "name": "campaign_id",
+                "operator": "EQUALS",
+                "expression": str(campaign_id)
+            }
+        ],
+        "limit": 10000
+    }
 
-    rows = fetch_keitaro_data(campaign_id, date_from, date_to)
-    if not rows:
-        logger.info(f"No data for campaign {campaign_id}")
-        return 0
+    try:
+        data = keitaro.post("/admin_api/v1/report/build", payload)
 
-    campaign_name = get_campaign_name(campaign_id)
+        # Newest log row gives both the reference total and the watermark
+        check = fetch_conversions_page(
+            campaign_id, date_from, date_to, 0, 1,
+            sort={"name": "datetime", "order": "DESC"}
+        )
+    except Exception as e:
+        logger.error(f"Error fetching Keitaro report: {e}, falling back to conversions log")
+        return fetch_keitaro_data(campaign_id, date_from, date_to)
 
-    conn = get_db_connection()
-    cur = conn.cursor()
+    report_rows = data.get("rows", [])
+    if len(report_rows) < data.get("total", 0):
+        logger.warning(f"Report truncated at {len(report_rows)} rows, falling back to conversions log")
+        return fetch_keitaro_data(campaign_id, date_from, date_to)
 
-    # Prepare data for insert
-    values = []
-    for row in rows:
+    # Blank sub_id_2 values collapse into one "unknown" group
+    aggregated = defaultdict(int)
+    for row in report_rows:
         event_type = row.get("sub_id_2", "") or "unknown"
         if not event_type.strip():
             event_type = "unknown"
+        aggregated[(row.get("day"), event_type)] += int(row.get("conversions", 0))
 
-        values.append((
-            campaign_id,
-            campaign_name,
-            row.get("day"),
-            event_type,
-            int(row.get("conversions", 0))
-        ))
+    report_total = sum(aggregated.values())
+    log_total = check.get("total", 0)
+    if abs(report_total - log_total) > REPORT_CHECK_TOLERANCE * log_total:
+        logger.warning(
+            f"Report total {report_total} does not match conversions log total {log_total}, "
+            f"falling back to conversions log"
+        )
+        return fetch_keitaro_data(campaign_id, date_from, date_to)
 
-    # Upsert data
-    execute_values(
-        cur,
+    logger.info(f"Fetched {len(aggregated)} grouped rows ({report_total} conversions) from report")
+
+    result = []
+    for (day, event_type), count in aggregated.items():
+        result.append({
+            "day": day,
+            "sub_id_2": event_type,
+            "conversions": count
+        })
+
+    latest = None
+    if check.get("rows"):
+        latest = check["rows"][0].get("datetime") or None
+
+    return result, latest
+
+
+_campaign_names = {}
+_campaign_names_fetched_at = 0.0
+_campaign_names_lock = threading.Lock()
+
+
+def refresh_campaigns(force=False):
+    """Refresh cached campaign names once they are older than CAMPAIGN_CACHE_TTL
+
+    Names come from keitaro_campaigns when that is fresh (e.g. after a
+    restart), otherwise from one bulk call to the campaigns list endpoint.
+    """
+    global _campaign_names_fetched_at
+
+    with _campaign_names_lock:
+        if not force and time.time() - _campaign_names_fetched_at < CAMPAIGN_CACHE_TTL:
+            return
+
+        conn = get_db_connection()
+        cur = conn.cursor()
+
+        if not force and not _campaign_names:
+            cur.execute("""
+                SELECT campaign_id, name, EXTRACT(EPOCH FROM NOW() - updated_at)
+                FROM keitaro_campaigns
+            """)
+            stored = cur.fetchall()
+            if stored:
+                _campaign_names.update({campaign_id: name for campaign_id, name, _ in stored})
+                age = max(float(age) for _, _, age in stored)
+                if age < CAMPAIGN_CACHE_TTL:
+                    _campaign_names_fetched_at = time.time() - age
+                    cur.close()
+                    conn.close()
+                    return
+
+        try:
+            campaigns = keitaro.get("/admin_api/v1/campaigns")
+        except Exception as e:
+            logger.warning(f"Could not refresh campaigns from Keitaro: {e}")
+            cur.close()
+            conn.close()
+            return
+
+        values = [
+            (int(c["id"]), c.get("name") or f"Campaign {c['id']}")
+            for c in campaigns if c.get("id") is not None
+        ]
+        if values:
+            execute_values(
+                cur,
+                """
+                INSERT INTO keitaro_campaigns (campaign_id, name)
+                VALUES %s
+                ON CONFLICT (campaign_id)
+                DO UPDATE SET
+                    name = EXCLUDED.name,
+                    updated_at = CURRENT_TIMESTAMP
+                """,
+                values
+            )
+            conn.commit()
+
+        cur.close()
+        conn.close()
+
+        _campaign_names.update(dict(values))
+        _campaign_names_fetched_at = time.time()
+        logger.info(f"Refreshed {len(values)} campaign names")
+
+
+def get_campaign_name(campaign_id):
+    """Get campaign name from the metadata cache"""
+    return _campaign_names.get(campaign_id, f"Campaign {campaign_id}")
+
+
+def get_watermark(cur, campaign_id):
+    """Get last synced conversion datetime for a campaign"""
+    cur.execute(
+        "SELECT watermark FROM keitaro_sync_state WHERE campaign_id = %s",
+        (campaign_id,)
+    )
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def set_watermark(cur, campaign_id, watermark):
+    """Store last synced conversion datetime for a campaign"""
+    cur.execute(
         """
+        INSERT INTO keitaro_sync_state (campaign_id, watermark)
+        VALUES (%s, %s)
+        ON CONFLICT (campaign_id)
+        DO UPDATE SET
+            watermark = GREATEST(keitaro_sync_state.watermark, EXCLUDED.watermark),
+            updated_at = CURRENT_TIMESTAMP
+        """,
+        (campaign_id, watermark)
+    )
+
+
+def get_sync_window(watermark):
+    """Get (date_from, date_to) to fetch given the stored watermark"""
+    # The watermark and the API range are in Keitaro's timezone, not the container's
+    now = datetime.now(KEITARO_TZ).replace(tzinfo=None)
+    oldest = now - timedelta(days=SYNC_DAYS)
+
+    # Whole days are refetched so their counts can be replaced, not added to
+    start = oldest
+    if watermark is not None:
+        start = max(oldest, watermark - timedelta(minutes=SYNC_LOOKBACK_MINUTES))
+
+    return start.strftime("%Y-%m-%d"), now.strftime("%Y-%m-%d")
+
+
+def copy_rows(cur, table, columns, values):
+    """Stream rows into a table with COPY FROM STDIN"""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in values:
+        writer.writerow(["" if v is None else v for v in row])
+    buf.seek(0)
+
+    cur.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+        buf
+    )
+
+
+def bulk_upsert_events(cur, values):
+    """Load event rows via a COPY staging table and merge them in one statement
+
+    Returns RETURNING rows of (date, inserted) for every row written.
+    """
+    cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS keitaro_events_stage (
+            campaign_id INTEGER,
+            date DATE,
+            event_type VARCHAR(100),
+            event_count INTEGER
+        ) ON COMMIT DROP
+    """)
+
+    copy_rows(
+        cur,
+        "keitaro_events_stage",
+        ["campaign_id", "date", "event_type", "event_count"],
+        values
+    )
+
+    # Rows whose values did not change are left alone (no new tuple, no WAL)
+    cur.execute("""
         INSERT INTO keitaro_events
-        (campaign_id, campaign_name, date, event_type, event_count)
-        VALUES %s
+        (campaign_id, date, event_type, event_count)
+        SELECT campaign_id, date, event_type, event_count
+        FROM keitaro_events_stage
         ON CONFLICT (campaign_id, date, event_type)
         DO UPDATE SET
-            campaign_name = EXCLUDED.campaign_name,
             event_count = EXCLUDED.event_count,
             updated_at = CURRENT_TIMESTAMP
-        """,
-        values
+        WHERE keitaro_events.event_count IS DISTINCT FROM EXCLUDED.event_count
+        RETURNING date, (xmax = 0)
+    """)
+    return cur.fetchall()
+
+
+def upsert_events(cur, values):
+    """Upsert event rows, skipping rows that did not change
+
+    Returns (inserted, updated, unchanged) counts and the set of dates
+    whose counts changed.
+    """
+    if len(values) >= COPY_THRESHOLD:
+        written = bulk_upsert_events(cur, values)
+    else:
+        written = execute_values(
+            cur,
+            """
+            INSERT INTO keitaro_events
+            (campaign_id, date, event_type, event_count)
+            VALUES %s
+            ON CONFLICT (campaign_id, date, event_type)
+            DO UPDATE SET
+                event_count = EXCLUDED.event_count,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE keitaro_events.event_count IS DISTINCT FROM EXCLUDED.event_count
+            RETURNING date, (xmax = 0)
+            """,
+            values,
+            fetch=True
+        )
+
+    # xmax = 0 only for freshly inserted tuples
+    inserted = sum(1 for _, is_insert in written if is_insert)
+    updated = len(written) - inserted
+    touched = {day for day, _ in written}
+    return inserted, updated, len(values) - len(written), touched
+
+
+# Rollup table -> (source table, time column, bucket expression, event type expression, count expression)
+ROLLUPS = {
+    "keitaro_events_daily": (
+        "keitaro_events", "date", "date", "event_type", "SUM(event_count)"
+    ),
+    "keitaro_events_weekly": (
+        "keitaro_events", "date", "date_trunc('week', date)::date", "event_type", "SUM(event_count)"
+    ),
+    "keitaro_events_monthly": (
+        "keitaro_events", "date", "date_trunc('month', date)::date", "event_type", "SUM(event_count)"
+    ),
+    # Hour grain needs raw rows, so it is only kept when RAW_SINK is enabled
+    "keitaro_events_hourly": (
+        "keitaro_conversions", "datetime", "date_trunc('hour', datetime)",
+        "CASE WHEN BTRIM(COALESCE(sub_id_2, ''), E' \\t\\r\\n') = '' THEN 'unknown' "
+        "ELSE LEFT(sub_id_2, 100) END",
+        "COUNT(*)"
+    ),
+}
+
+
+def get_bucket_range(table, day_from, day_to):
+    """Get [start, end) covering whole rollup buckets for a range of days"""
+    if table == "keitaro_events_weekly":
+        start = day_from - timedelta(days=day_from.weekday())
+        end = day_to - timedelta(days=day_to.weekday()) + timedelta(days=7)
+        return start, end
+    if table == "keitaro_events_monthly":
+        return month_start(day_from), next_month(day_to)
+    return day_from, day_to + timedelta(days=1)
+
+
+def refresh_rollups(cur, campaign_id, days):
+    """Recompute the rollup buckets of a campaign that contain the given days"""
+    if not days:
+        return
+
+    days = [d if not isinstance(d, str) else datetime.strptime(d, "%Y-%m-%d").date() for d in days]
+    day_from, day_to = min(days), max(days)
+
+    for table, (source, time_column, bucket, event_type, count) in ROLLUPS.items():
+        if source == "keitaro_conversions" and not RAW_SINK:
+            continue
+
+        start, end = get_bucket_range(table, day_from, day_to)
+
+        # Upsert changed buckets and drop groups that no longer exist in the source
+        cur.execute(
+            f"""
+            WITH fresh AS (
+                SELECT campaign_id, {bucket} AS bucket, {event_type} AS event_type,
+                       {count} AS event_count
+                FROM {source}
+                WHERE campaign_id = %(campaign_id)s
+                  AND {time_column} >= %(start)s AND {time_column} < %(end)s
+                GROUP BY 1, 2, 3
+            ), stale AS (
+                DELETE FROM {table} t
+                WHERE t.campaign_id = %(campaign_id)s
+                  AND t.bucket >= %(start)s AND t.bucket < %(end)s
+                  AND NOT EXISTS (
+                      SELECT 1 FROM fresh f
+                      WHERE f.bucket = t.bucket AND f.event_type = t.event_type
+                  )
+            )
+            INSERT INTO {table} (campaign_id, bucket, event_type, event_count)
+            SELECT campaign_id, bucket, event_type, event_count FROM fresh
+            ON CONFLICT (campaign_id, bucket, event_type)
+            DO UPDATE SET
+                event_count = EXCLUDED.event_count,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE {table}.event_count IS DISTINCT FROM EXCLUDED.event_count
+            """,
+            {"campaign_id": campaign_id, "start": start, "end": end}
+        )
+
+
+def check_deadline(campaign_id, deadline):
+    """Raise if a sync ran past its deadline, so an abandoned run never commits"""
+    if deadline is not None and time.monotonic() > deadline:
+        raise TimeoutError(f"Campaign {campaign_id} sync ran past {CAMPAIGN_TIMEOUT}s, not committing")
+
+
+def sync_campaign(campaign_id, deadline=None):
+    """Sync data for a specific campaign
+
+    deadline is a time.monotonic() value after which nothing is committed.
+    Returns (records, changed): rows synced and rows actually written.
+    """
+    logger.info(f"Syncing campaign {campaign_id} ({get_campaign_name(campaign_id)})")
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    # Nothing is committed unless the whole fetch succeeded
+    try:
+        watermark = get_watermark(cur, campaign_id)
+        date_from, date_to = get_sync_window(watermark)
+        logger.info(f"Campaign {campaign_id} watermark: {watermark}, fetching {date_from} - {date_to}")
+
+        sink = None
+        if RAW_SINK:
+            ensure_conversion_partitions(get_months(date_from, date_to))
+
+            def sink(page):
+                store_conversions(cur, campaign_id, page)
+
+        if FETCH_MODE == "report":
+            rows, latest = fetch_keitaro_report_data(campaign_id, date_from, date_to)
+        else:
+            rows, latest = fetch_keitaro_data(campaign_id, date_from, date_to, sink=sink)
+        if not rows:
+            logger.info(f"No data for campaign {campaign_id}")
+            check_deadline(campaign_id, deadline)
+            conn.commit()
+            return 0, 0
+
+        # Prepare data for insert
+        values = []
+        for row in rows:
+            event_type = row.get("sub_id_2", "") or "unknown"
+            if not event_type.strip():
+                event_type = "unknown"
+
+            values.append((
+                campaign_id,
+                row.get("day"),
+                event_type,
+                int(row.get("conversions", 0))
+            ))
+
+        # Upsert data
+        inserted, updated, unchanged, touched = upsert_events(cur, values)
+        refresh_rollups(cur, campaign_id, touched)
+
+        if latest:
+            set_watermark(cur, campaign_id, latest)
+
+        check_deadline(campaign_id, deadline)
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+    if latest or watermark:
+        set_watermark_age(campaign_id, max(str(latest or ""), str(watermark or "")))
+    if touched:
+        record_changes(campaign_id, touched)
+    for result, count in (("inserted", inserted), ("updated", updated), ("unchanged", unchanged)):
+        SYNC_ROWS.labels(str(campaign_id), result).inc(count)
+
+    logger.info(
+        f"Synced {len(values)} records for campaign {campaign_id}: "
+        f"{inserted} inserted, {updated} updated, {unchanged} unchanged"
     )
+    return len(values), inserted + updated
+
+
+def get_campaign_ids():
+    """Get configured campaign ids"""
+    return [int(c.strip()) for c in CAMPAIGN_IDS if c.strip()]
+
+
+def run_campaign(campaign_id):
+    """Sync one campaign without raising
+
+    Returns (status, duration, records, changed).
+    """
+    started = time.monotonic()
+    try:
+        records, changed = sync_campaign(campaign_id, deadline=started + CAMPAIGN_TIMEOUT)
+        status = "ok"
+        SYNC_LAST_SUCCESS.labels(str(campaign_id)).set(time.time())
+    except Exception as e:
+        logger.error(f"Sync error for campaign {campaign_id}: {e}")
+        status, records, changed = "failed", 0, 0
+
+    duration = time.monotonic() - started
+    SYNC_DURATION.labels(str(campaign_id), status).observe(duration)
+    return status, duration, records, changed
+
+
+def run_maintenance():
+    """Run periodic housekeeping that is not tied to one campaign"""
+    try:
+        refresh_campaigns()
+    except Exception as e:
+        logger.warning(f"Campaign metadata refresh failed: {e}")
+
+    if RAW_SINK:
+        try:
+            detach_old_conversion_partitions()
+        except Exception as e:
+            logger.error(f"Partition maintenance failed: {e}")
+
+
+_superset_celery = None
+
+
+def send_superset_task(name, **kwargs):
+    """Queue a task by name on Superset's Celery workers
+
+    Returns False without SUPERSET_BROKER_URL or when queueing fails.
+    """
+    global _superset_celery
+
+    if not SUPERSET_BROKER_URL:
+        return False
+    if Celery is None:
+        logger.warning(f"celery not installed, cannot send {name} to Superset")
+        return False
+
+    if _superset_celery is None:
+        _superset_celery = Celery(broker=SUPERSET_BROKER_URL)
+    try:
+        _superset_celery.send_task(name, kwargs=kwargs)
+    except Exception as e:
+        logger.warning(f"Could not send {name} to Superset: {e}")
+        return False
+    return True
+
+
+def get_date_ranges(days):
+    """Collapse dates into sorted [first, last] runs of consecutive days"""
+    ranges = []
+    for day in sorted(days):
+        if ranges and day - ranges[-1][1] == timedelta(days=1):
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return ranges
+
+
+_pending_changes = defaultdict(set)
+_pending_changes_lock = threading.Lock()
+_pending_since = None
 
-    conn.commit()
-    cur.close()
-    conn.close()
 
-    logger.info(f"Synced {len(values)} records for campaign {campaign_id}")
-    return len(values)
+def record_changes(campaign_id, days):
+    """Remember days of a campaign that changed, for the next publish_changes"""
+    global _pending_since
+
+    with _pending_changes_lock:
+        if _pending_since is None:
+            _pending_since = time.monotonic()
+        _pending_changes[campaign_id].update(days)
+
+
+def publish_changes(max_age=0):
+    """Tell Superset which days changed so it evicts their cached results
+
+    All recorded campaigns go out in one task, and only once the oldest
+    change is max_age seconds old, so Superset scans its cache once per
+    round of syncs rather than once per campaign.
+    """
+    global _pending_since
+
+    with _pending_changes_lock:
+        if not _pending_changes or time.monotonic() - _pending_since < max_age:
+            return
+        changes = dict(_pending_changes)
+        _pending_changes.clear()
+        _pending_since = None
+
+    ranges = {
+        str(campaign_id): [[f"{first:%Y-%m-%d}", f"{last:%Y-%m-%d}"] for first, last in get_date_ranges(days)]
+        for campaign_id, days in changes.items()
+    }
+    if send_superset_task("keitaro.invalidate_cache", changes=ranges):
+        logger.info(f"Published changed days of {len(ranges)} campaigns to Superset")
+
+
+def trigger_cache_warmup():
+    """Ask Superset to re-run the charts of the most viewed dashboards"""
+    if send_superset_task(
+        "cache-warmup",
+        strategy_name="top_n_dashboards",
+        top_n=CACHE_WARMUP_TOP_N,
+        since="7 days ago",
+    ):
+        logger.info(f"Requested cache warm-up of the top {CACHE_WARMUP_TOP_N} dashboards")
 
 
 def run_sync():
-    """Run sync for all campaigns"""
+    """Run sync for all campaigns in parallel, once (the "once" command)
+
+    Each campaign runs in its own worker; a failure or timeout is logged
+    and does not affect the others. Returns total synced records.
+    """
+    campaign_ids = get_campaign_ids()
+    started = {}
+    results = {}
+
+    run_maintenance()
+
+    def run_one(campaign_id):
+        started[campaign_id] = time.monotonic()
+        return run_campaign(campaign_id)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, SYNC_CONCURRENCY))
+    futures = {executor.submit(run_one, c): c for c in campaign_ids}
+    pending = set(futures)
+
+    while pending:
+        done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            results[futures[future]] = future.result()
+
+        # A stuck campaign is abandoned; its thread cannot be killed, but the cycle moves on
+        now = time.monotonic()
+        for future in list(pending):
+            campaign_id = futures[future]
+            if campaign_id in started and now - started[campaign_id] > CAMPAIGN_TIMEOUT:
+                logger.error(f"Sync timed out for campaign {campaign_id} after {CAMPAIGN_TIMEOUT}s")
+                results[campaign_id] = ("timeout", now - started[campaign_id], 0, 0)
+                pending.discard(future)
+
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    # Cycle summary
     total = 0
-    for campaign_id in CAMPAIGN_IDS:
-        campaign_id = campaign_id.strip()
-        if campaign_id:
-            total += sync_campaign(int(campaign_id))
+    for campaign_id in campaign_ids:
+        status, duration, records, changed = results[campaign_id]
+        logger.info(
+            f"Campaign {campaign_id}: {status} in {duration:.1f}s, "
+            f"{records} records, {changed} changed"
+        )
+        total += records
+
+    publish_changes()
+    if any(result[3] for result in results.values()):
+        trigger_cache_warmup()
     return total
 
 
+class CampaignScheduler:
+    """Per-campaign next-run times with intervals adapted to the change rate
+
+    A campaign whose sync wrote changes is polled twice as often, one
+    without changes 1.5x less often, within SYNC_MIN_INTERVAL and
+    SYNC_MAX_INTERVAL. Intervals are measured from the start of a sync,
+    so sync duration does not add drift.
+    """
+
+    def __init__(self, campaign_ids, now):
+        self.interval = {}
+        self.next_run = {}
+
+        # Spread first runs over one interval so campaigns do not hit the API together
+        for i, campaign_id in enumerate(campaign_ids):
+            self.interval[campaign_id] = SYNC_INTERVAL
+            self.next_run[campaign_id] = now + i * SYNC_INTERVAL / len(campaign_ids)
+
+    def due(self, now):
+        """Get campaigns whose next run has come"""
+        return [c for c, at in self.next_run.items() if at <= now]
+
+    def start(self, campaign_id):
+        """Mark a campaign as running so it is not picked again"""
+        self.next_run[campaign_id] = float("inf")
+
+    def finish(self, campaign_id, started, status, changed):
+        """Adapt the interval to the sync outcome and schedule the next run"""
+        interval = self.interval[campaign_id]
+        if status == "ok" and changed:
+            interval = max(SYNC_MIN_INTERVAL, interval / 2)
+        elif status == "ok":
+            interval = min(SYNC_MAX_INTERVAL, interval * 1.5)
+
+        # A little jitter keeps campaigns from drifting into lockstep
+        self.interval[campaign_id] = interval
+        self.next_run[campaign_id] = started + interval * random.uniform(0.9, 1.1)
+        return interval
+
+
+def run_scheduler():
+    """Sync each campaign on its own adaptive schedule, checked every SCHEDULER_TICK seconds"""
+    campaign_ids = get_campaign_ids()
+    scheduler = CampaignScheduler(campaign_ids, time.monotonic())
+    executor = ThreadPoolExecutor(max_workers=max(1, SYNC_CONCURRENCY))
+    running = {}
+    started = {}
+    abandoned = set()
+    next_tick = time.monotonic()
+    next_maintenance = next_tick
+    changed_since_warmup = 0
+    last_warmup = float("-inf")
+
+    def run_one(campaign_id):
+        started[campaign_id] = time.monotonic()
+        return run_campaign(campaign_id)
+
+    while True:
+        now = time.monotonic()
+
+        # Collect finished syncs. A stuck one is abandoned but stays tracked:
+        # its thread cannot be killed, so the campaign is not started again
+        # until it exits (it cannot commit past its deadline).
+        for future, campaign_id in list(running.items()):
+            if future.done():
+                status, duration, records, changed = future.result()
+                abandoned.discard(future)
+            elif future not in abandoned and campaign_id in started and now - started[campaign_id] > CAMPAIGN_TIMEOUT:
+                logger.error(f"Sync timed out for campaign {campaign_id} after {CAMPAIGN_TIMEOUT}s, waiting for it to exit")
+                abandoned.add(future)
+                continue
+            else:
+                continue
+
+            del running[future]
+            changed_since_warmup += changed
+            interval = scheduler.finish(campaign_id, started.pop(campaign_id), status, changed)
+            logger.info(
+                f"Campaign {campaign_id}: {status} in {duration:.1f}s, "
+                f"{records} records, {changed} changed, next in {interval:.0f}s"
+            )
+
+        # Evict stale caches once per round, or every SYNC_MIN_INTERVAL if syncs never drain
+        publish_changes(0 if len(running) == len(abandoned) else SYNC_MIN_INTERVAL)
+
+        # Warm Superset's caches once a round of syncs that wrote new data has drained
+        if len(running) == len(abandoned) and changed_since_warmup and now - last_warmup >= CACHE_WARMUP_MIN_INTERVAL:
+            trigger_cache_warmup()
+            changed_since_warmup = 0
+            last_warmup = now
+
+        if now >= next_maintenance:
+            run_maintenance()
+            next_maintenance = now + 3600
+
+        for campaign_id in scheduler.due(now):
+            scheduler.start(campaign_id)
+            running[executor.submit(run_one, campaign_id)] = campaign_id
+
+        # Fixed ticks: sleep to the next boundary rather than a fixed amount
+        next_tick += SCHEDULER_TICK
+        if next_tick < time.monotonic():
+            next_tick = time.monotonic()
+        time.sleep(max(0, next_tick - time.monotonic()))
+
+
+def get_backfill_shards(date_from, date_to, shard):
+    """Split an inclusive date range into [start, end) day or hour shards"""
+    step = timedelta(hours=1) if shard == "hour" else timedelta(days=1)
+    start = datetime.strptime(date_from, "%Y-%m-%d")
+    end = datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1)
+
+    shards = []
+    while start < end:
+        shards.append((start, start + step))
+        start += step
+    return shards
+
+
+def backfill_shard(campaign_id, shard_start, shard_end):
+    """Fetch one backfill shard and checkpoint its counts (runs in a worker process)
+
+    Returns the number of conversions in the shard.
+    """
+    day = f"{shard_start:%Y-%m-%d}"
+    filters = ()
+    if shard_end - shard_start < timedelta(days=1):
+        filters = (
+            {"name": "datetime", "operator": "GREATER_THAN_OR_EQUAL", "expression": f"{shard_start:%Y-%m-%d %H:%M:%S}"},
+            {"name": "datetime", "operator": "LESS_THAN", "expression": f"{shard_end:%Y-%m-%d %H:%M:%S}"},
+        )
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        sink = None
+        if RAW_SINK:
+            ensure_conversion_partitions(get_months(day, day))
+
+            def sink(page):
+                store_conversions(cur, campaign_id, page)
+
+        rows, _ = fetch_keitaro_data(campaign_id, day, day, sink=sink, filters=filters)
+
+        counts = defaultdict(dict)
+        for row in rows:
+            counts[row["day"]][row["sub_id_2"]] = row["conversions"]
+        conversions = sum(row["conversions"] for row in rows)
+
+        cur.execute(
+            """
+            INSERT INTO keitaro_backfill_shards
+            (campaign_id, shard_start, shard_end, status, conversions, counts)
+            VALUES (%s, %s, %s, 'done', %s, %s)
+            ON CONFLICT (campaign_id, shard_start, shard_end)
+            DO UPDATE SET
+                status = 'done',
+                conversions = EXCLUDED.conversions,
+                counts = EXCLUDED.counts,
+                updated_at = CURRENT_TIMESTAMP
+            """,
+            (campaign_id, shard_start, shard_end, conversions, Json(counts))
+        )
+        conn.commit()
+        return conversions
+    finally:
+        cur.close()
+        conn.close()
+
+
+def merge_backfill(campaign_id, shards):
+    """Write day counts from checkpointed shards into keitaro_events
+
+    Only days whose shards are all done are written, so a day is never
+    stored with partial counts. Days written after their oldest shard was
+    fetched (by the live sync or an earlier merge) are left alone, so a
+    rerun never puts an older snapshot back.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT shard_start, shard_end, counts, updated_at
+            FROM keitaro_backfill_shards
+            WHERE campaign_id = %s AND status = 'done'
+              AND shard_start >= %s AND shard_end <= %s
+            """,
+            (campaign_id, shards[0][0], shards[-1][1])
+        )
+        done = {(start, end): (counts, updated_at) for start, end, counts, updated_at in cur.fetchall()}
+
+        cur.execute(
+            """
+            SELECT date, MAX(updated_at)
+            FROM keitaro_events
+            WHERE campaign_id = %s AND date >= %s AND date < %s
+            GROUP BY date
+            """,
+            (campaign_id, shards[0][0].date(), shards[-1][1])
+        )
+        written = dict(cur.fetchall())
+
+        by_day = defaultdict(list)
+        for start, end in shards:
+            by_day[start.date()].append(done.get((start, end)))
+
+        values = []
+        newer = 0
+        for day, day_shards in sorted(by_day.items()):
+            if any(shard is None for shard in day_shards):
+                continue
+            if day in written and written[day] > min(updated_at for _, updated_at in day_shards):
+                newer += 1
+                continue
+            day_counts = [counts for counts, _ in day_shards]
+            totals = defaultdict(int)
+            for c in day_counts:
+                for event_type, count in c.get(f"{day:%Y-%m-%d}", {}).items():
+                    totals[event_type] += count
+            values.extend((campaign_id, day, event_type, count) for event_type, count in totals.items())
+
+        if newer:
+            logger.info(f"Backfill kept {newer} days of campaign {campaign_id} that were written after their shards")
+        if not values:
+            return 0
+
+        inserted, updated, unchanged, touched = upsert_events(cur, values)
+        refresh_rollups(cur, campaign_id, touched)
+        conn.commit()
+        if touched:
+            record_changes(campaign_id, touched)
+
+        logger.info(
+            f"Backfill merged {len(values)} records for campaign {campaign_id}: "
+            f"{inserted} inserted, {updated} updated, {unchanged} unchanged"
+        )
+        return len(values)
+    finally:
+        cur.close()
+        conn.close()
+
+
+def init_backfill_worker(workers):
+    """Give a backfill worker process its share of KEITARO_RPS and FETCH_CONCURRENCY"""
+    global FETCH_CONCURRENCY
+
+    FETCH_CONCURRENCY = max(1, FETCH_CONCURRENCY // workers)
+    keitaro.bucket = TokenBucket(KEITARO_RPS / workers)
+
+
+def run_backfill(campaign_ids, date_from, date_to, shard="day", workers=BACKFILL_WORKERS):
+    """Backfill a historical date range, sharded across worker processes
+
+    Completed shards are checkpointed in keitaro_backfill_shards, so
+    running the same backfill again only processes what is left.
+    Returns the number of failed shards.
+    """
+    shards = get_backfill_shards(date_from, date_to, shard)
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT campaign_id, shard_start, shard_end
+        FROM keitaro_backfill_shards
+        WHERE status = 'done' AND campaign_id = ANY(%s)
+        """,
+        (campaign_ids,)
+    )
+    done = set(cur.fetchall())
+    cur.close()
+    conn.close()
+
+    todo = [(c, start, end) for c in campaign_ids for start, end in shards if (c, start, end) not in done]
+    logger.info(
+        f"Backfill {date_from} - {date_to} by {shard}: {len(todo)} of "
+        f"{len(shards) * len(campaign_ids)} shards left, {workers} workers"
+    )
+
+    failed = 0
+    workers = max(1, workers)
+    # spawn: workers must not inherit the parent's HTTP session or DB sockets.
+    # Each has its own client, so the rate and concurrency budget is split.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=context, initializer=init_backfill_worker, initargs=(workers,)
+    ) as executor:
+        futures = {executor.submit(backfill_shard, *job): job for job in todo}
+        for i, future in enumerate(as_completed(futures), 1):
+            campaign_id, start, end = futures[future]
+            try:
+                conversions = future.result()
+                logger.info(f"[{i}/{len(todo)}] Campaign {campaign_id} {start} - {end}: {conversions} conversions")
+            except Exception as e:
+                failed += 1
+                logger.error(f"[{i}/{len(todo)}] Campaign {campaign_id} {start} - {end} failed: {e}")
+
+    for campaign_id in campaign_ids:
+        merge_backfill(campaign_id, shards)
+    publish_changes()
+
+    if failed:
+        logger.error(f"Backfill finished with {failed} failed shards, run it again to resume")
+    else:
+        logger.info("Backfill complete")
+    return failed
+
+
 def main():
     """Main entry point"""
+    parser = argparse.ArgumentParser(description="Keitaro to PostgreSQL sync service")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("once", help="sync every campaign once and exit")
+    backfill = commands.add_parser("backfill", help="backfill a historical date range and exit")
+    backfill.add_argument("--from", dest="date_from", required=True, help="first day, YYYY-MM-DD")
+    backfill.add_argument("--to", dest="date_to", required=True, help="last day, YYYY-MM-DD")
+    backfill.add_argument("--shard", choices=["day", "hour"], default="day", help="shard size")
+    backfill.add_argument("--workers", type=int, default=BACKFILL_WORKERS, help="worker processes")
+    backfill.add_argument("--campaigns", help="comma-separated campaign ids (default: CAMPAIGN_IDS)")
+    args = parser.parse_args()
+
     logger.info("Starting Keitaro sync service")
     logger.info(f"Keitaro URL: {KEITARO_URL}")
     logger.info(f"Campaigns: {CAMPAIGN_IDS}")
-    logger.info(f"Sync interval: {SYNC_INTERVAL}s")
+    logger.info(f"Sync interval: {SYNC_INTERVAL}s ({SYNC_MIN_INTERVAL}-{SYNC_MAX_INTERVAL}s adaptive)")
+    logger.info(f"Fetch mode: {FETCH_MODE}, {PAGINATION} pagination")
+    logger.info(f"Raw conversion sink: {'enabled' if RAW_SINK else 'disabled'}")
 
     if not KEITARO_API_KEY:
         logger.error("KEITARO_API_KEY not set!")
@@ -257,16 +2103,25 @@ def main():
     # Initialize database
     init_database()
 
-    # Run sync loop
-    while True:
-        try:
-            records = run_sync()
-            logger.info(f"Sync complete. Total records: {records}")
-        except Exception as e:
-            logger.error(f"Sync error: {e}")
+    if args.command == "backfill":
+        campaign_ids = get_campaign_ids()
+        if args.campaigns:
+            campaign_ids = [int(c) for c in args.campaigns.split(",") if c.strip()]
+        failed = run_backfill(campaign_ids, args.date_from, args.date_to, args.shard, args.workers)
+        sys.exit(1 if failed else 0)
 
-        logger.info(f"Sleeping for {SYNC_INTERVAL} seconds...")
-        time.sleep(SYNC_INTERVAL)
+    if args.command == "once":
+        run_sync()
+        return
+
+    if METRICS_PORT and prometheus_client is not None:
+        prometheus_client.start_http_server(METRICS_PORT)
+        logger.info(f"Metrics: http://0.0.0.0:{METRICS_PORT}/metrics")
+    elif METRICS_PORT:
+        logger.warning("prometheus_client not installed, /metrics disabled")
+
+    # Run sync loop
+    run_scheduler()
 
 
 if __name__ == "__main__":